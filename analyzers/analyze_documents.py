@@ -15,17 +15,14 @@ Genera reporte completo en samples/lml_documents_analysis.txt
 """
 
 import json
-import sys
-import io
-import re
+from array import array
 from collections import Counter, defaultdict
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
-from pathlib import Path
 
-# Forzar UTF-8 para emojis en Windows
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+from json_helpers import TYPE_NAMES, dump_document, load_json, orjson
+from utf8_stdout import force_utf8_stdout
 
 # Configuración
 # Obtener directorio del script (analyzers/)
@@ -35,13 +32,91 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 SAMPLE_FILE = SCRIPT_DIR.parent / "samples" / "lml_documents_mesa4core_sample.json"
 OUTPUT_FILE = SCRIPT_DIR.parent / "samples" / "lml_documents_analysis.txt"
 
+# Campos de Mongo que nunca se consideran dinámicos
+MONGO_FIELDS = frozenset({"__v", "_id"})
+
+# Objetos anidados de interés
+KNOWN_OBJECTS = [
+    "createdBy",
+    "updatedBy",
+    "recipients",
+    "viewers",
+    "documentSteps",
+    "lumbreStatus",
+    "documentTypePrefix",
+    "instancePrivileges",
+    "calculatedProps",
+    "signerPositionMap",
+    "lumbreNextSigner",
+    "lumbreNextParticipant",
+    "lumbreNextReviewer",
+]
+
+# Catálogos embebidos como objeto con id y name
+OBJECT_CATALOGS = ("lumbreStatus", "documentTypePrefix")
+
+# Campos string que actúan como catálogos
+STRING_CATALOGS = (
+    "documentTypeName",
+    "documentTypeSignature",
+    "documentTypeVisibility",
+    "documentTypeComunicable",
+)
+
+
+def dynamic_base_name(field_name):
+    """
+    Si el campo es dinámico (termina en _N, p.ej. campo_nombre_3) devuelve su
+    nombre base; si no, None. Equivale a re.match(r"^(.+)_(\\d+)$") (para keys
+    sin saltos de línea) pero con slicing, sin armar un objeto match por key.
+    """
+    idx = field_name.rfind("_")
+    if idx > 0 and field_name[idx + 1 :].isdecimal():
+        return field_name[:idx]
+    return None
+
+
+def short_repr(value):
+    """
+    Representación corta de un valor para los samples de campos. Arrays y
+    objetos se resumen (tamaño / primeras keys) en vez de pasar el valor
+    completo por str() para después recortarlo.
+    """
+    value_type = type(value)
+    if value_type is list:
+        return f"array[{len(value)}]"
+    if value_type is dict:
+        return f"object{{{', '.join(islice(value, 5))}}}"
+    return str(value)[:100]
+
+
+def dump_json_truncated(value, limit):
+    """
+    Igual que dump_document pero cortado en limit caracteres (con marca de
+    truncado). Con la stdlib se deja de serializar al llegar al límite en vez
+    de armar el JSON completo; orjson serializa todo en C y solo se recorta.
+    """
+    if orjson is not None:
+        text = dump_document(value)
+        if len(text) <= limit:
+            return text
+        return text[:limit] + "\n... [TRUNCADO]"
+
+    encoder = json.JSONEncoder(indent=2, default=str, ensure_ascii=False)
+    chunks = []
+    size = 0
+    for chunk in encoder.iterencode(value):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return "".join(chunks)[:limit] + "\n... [TRUNCADO]"
+    return "".join(chunks)
+
 
 def load_sample():
     """Carga el archivo JSON de sample."""
     try:
-        with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
+        return load_json(SAMPLE_FILE)
     except FileNotFoundError:
         print(f"[ERROR] No se encontró el archivo {SAMPLE_FILE}")
         return None
@@ -50,298 +125,287 @@ def load_sample():
         return None
 
 
-def analyze_field_coverage(documents):
-    """
-    Analiza qué campos existen y en cuántos documentos aparecen.
-    Separa campos estáticos de campos dinámicos (generados por formularios).
-    """
-    field_stats = {}
-    dynamic_fields = defaultdict(lambda: {"count": 0, "samples": []})
-    total_docs = len(documents)
-
-    # Patrón para detectar campos dinámicos (terminan en _N o tienen patrón campo_nombre_N)
-    dynamic_pattern = re.compile(r"^(.+)_(\d+)$")
-
-    for doc in documents:
-        for field_name in doc.keys():
-            # Detectar si es campo dinámico
-            match = dynamic_pattern.match(field_name)
-            if match and field_name not in [
-                "__v",
-                "_id",
-            ]:  # Excluir campos conocidos de Mongo
-                base_name = match.group(1)
-                dynamic_fields[field_name]["count"] += 1
-                if len(dynamic_fields[field_name]["samples"]) < 2 and doc.get(
-                    field_name
-                ):
-                    dynamic_fields[field_name]["samples"].append(doc.get(field_name))
-                continue
+class FieldStat:
+    """Estadísticas de un campo estático de primer nivel."""
 
-            if field_name not in field_stats:
-                field_stats[field_name] = {
-                    "count": 0,
-                    "types": set(),
-                    "sample_values": [],
-                    "null_count": 0,
-                }
-
-            value = doc.get(field_name)
-            field_stats[field_name]["count"] += 1
-
-            # Detectar tipo
-            if value is None:
-                field_stats[field_name]["null_count"] += 1
-                field_stats[field_name]["types"].add("null")
-            elif isinstance(value, dict):
-                field_stats[field_name]["types"].add("object")
-            elif isinstance(value, list):
-                field_stats[field_name]["types"].add("array")
-            elif isinstance(value, bool):
-                field_stats[field_name]["types"].add("boolean")
-            elif isinstance(value, int):
-                field_stats[field_name]["types"].add("integer")
-            elif isinstance(value, float):
-                field_stats[field_name]["types"].add("float")
-            else:
-                field_stats[field_name]["types"].add("string")
-
-            # Guardar samples
-            if len(field_stats[field_name]["sample_values"]) < 3:
-                if value and value not in field_stats[field_name]["sample_values"]:
-                    sample_str = str(value)[:100] if value else None
-                    if sample_str:
-                        field_stats[field_name]["sample_values"].append(sample_str)
+    __slots__ = (
+        "count",
+        "types",
+        "sample_values",
+        "sample_seen",
+        "samples_full",
+        "null_count",
+        "coverage",
+    )
 
-    # Calcular cobertura
-    for field_name, stats in field_stats.items():
-        stats["coverage"] = (stats["count"] / total_docs) * 100
-        stats["types"] = list(stats["types"])
+    def __init__(self):
+        self.count = 0
+        self.types = set()
+        self.sample_values = []
+        self.sample_seen = set()  # short_repr ya guardados en sample_values (dedup O(1))
+        self.samples_full = False  # True al juntar los 3 samples
+        self.null_count = 0
+        self.coverage = 0.0
+
+
+class ArrayStat:
+    """Estadísticas de un campo array: cardinalidad y contenido."""
+
+    __slots__ = (
+        "sizes",
+        "docs_with_array",
+        "docs_with_data",
+        "content_type",
+        "object_keys",
+        "sample_items",
+        "samples_full",
+    )
 
-    return field_stats, dict(dynamic_fields)
+    def __init__(self):
+        self.sizes = array("l")  # Enteros sin boxear: uno por doc con el array
+        self.docs_with_array = 0
+        self.docs_with_data = 0
+        self.content_type = None
+        self.object_keys = Counter()
+        self.sample_items = []
+        self.samples_full = False  # True al juntar los 2 samples
 
 
-def analyze_arrays(documents):
+class DocumentAnalyzer:
     """
-    Analiza arrays conocidos: participants, signers, reviewers, shareWith, movements, etc.
+    Acumula todos los análisis del reporte en una sola pasada: cada documento
+    se incorpora con feed() y al terminar se llama a finalize().
+
+    - Campos de primer nivel (cobertura, tipos, samples) y campos dinámicos
+    - Arrays: cardinalidad, estructura interna, campos de objetos
+    - Objetos anidados: recipients, viewers, createdBy, updatedBy, etc.
+    - Catálogos embebidos: lumbreStatus, documentTypePrefix, etc.
+    - Snapshots de usuarios en createdBy/updatedBy
+    - Estructura de recipients y viewers
     """
-    array_stats = {}
-    known_arrays = [
-        "participants",
-        "signers",
-        "reviewers",
-        "shareWith",
-        "movements",
-    ]
-
-    # Detectar todos los arrays dinámicamente también
-    for doc in documents:
-        for key, value in doc.items():
-            if isinstance(value, list) and key not in array_stats:
-                array_stats[key] = {
-                    "sizes": [],
-                    "docs_with_array": 0,
-                    "docs_with_data": 0,
-                    "content_type": None,
-                    "object_keys": Counter(),
-                    "sample_items": [],
-                }
-
-    # Analizar cada array
-    for doc in documents:
-        for field_name, stats in array_stats.items():
-            value = doc.get(field_name)
 
-            if isinstance(value, list):
-                stats["docs_with_array"] += 1
-                stats["sizes"].append(len(value))
+    def __init__(self):
+        self.field_stats = {}
+        self.dynamic_fields = defaultdict(lambda: {"count": 0, "samples": []})
+        self.array_stats = {}
+        self.object_stats = {}
+        self.catalogs = {
+            "lumbreStatus": {},
+            "documentTypePrefix": {},
+            # Los catálogos string son dicts simples (valor -> count); se
+            # convierten a Counter recién al ordenar para el reporte
+            "documentTypeName": {},
+            "documentTypeSignature": {},
+            "documentTypeVisibility": {},
+            "documentTypeComunicable": {},
+        }
+        self.snapshot_stats = {
+            "createdBy": {
+                "present": 0,
+                "has_user": 0,
+                "user_keys": Counter(),
+                "unique_user_ids": set(),
+            },
+            "updatedBy": {
+                "present": 0,
+                "has_user": 0,
+                "user_keys": Counter(),
+                "unique_user_ids": set(),
+            },
+        }
+        self.rv_stats = {
+            "recipients": {
+                "users": {"docs_with_data": 0, "total_items": 0},
+                "areas": {"docs_with_data": 0, "total_items": 0},
+                "subareas": {"docs_with_data": 0, "total_items": 0},
+                "groups": {"docs_with_data": 0, "total_items": 0},
+                "emails": {"docs_with_data": 0, "total_items": 0},
+            },
+            "viewers": {
+                "users": {"docs_with_data": 0, "total_items": 0},
+                "areas": {"docs_with_data": 0, "total_items": 0},
+                "subareas": {"docs_with_data": 0, "total_items": 0},
+            },
+        }
+        self.total_docs = 0
+
+        # Campo conocido -> handlers que lo analizan. Se despachan desde el
+        # recorrido de doc.items(), sin un doc.get() por cada campo conocido
+        handlers = defaultdict(list)
+        for key in KNOWN_OBJECTS:
+            handlers[key].append(self.feed_object)
+        for key in OBJECT_CATALOGS:
+            handlers[key].append(self.feed_object_catalog)
+        for key in STRING_CATALOGS:
+            handlers[key].append(self.feed_string_catalog)
+        for key in self.snapshot_stats:
+            handlers[key].append(self.feed_snapshot)
+        for key in self.rv_stats:
+            handlers[key].append(self.feed_recipients)
+        self.field_handlers = {key: tuple(funcs) for key, funcs in handlers.items()}
+
+    def feed(self, doc):
+        """Incorpora un documento a todas las estadísticas."""
+        self.total_docs += 1
+        field_stats = self.field_stats
+        dynamic_fields = self.dynamic_fields
+        array_stats = self.array_stats
+        type_name = TYPE_NAMES.get
+        field_handlers = self.field_handlers.get
+
+        for field_name, value in doc.items():
+            # El tipo se calcula una vez y sirve para arrays y para TYPE_NAMES
+            value_type = type(value)
+
+            # Arrays (la entrada se crea la primera vez que aparece el campo)
+            if value_type is list:
+                array_stat = array_stats.get(field_name)
+                if array_stat is None:
+                    array_stat = array_stats[field_name] = ArrayStat()
+
+                array_stat.docs_with_array += 1
+                array_stat.sizes.append(len(value))
 
                 if len(value) > 0:
-                    stats["docs_with_data"] += 1
+                    array_stat.docs_with_data += 1
 
                 # Analizar contenido
                 for item in value:
-                    if isinstance(item, dict):
-                        stats["content_type"] = "objects"
-                        stats["object_keys"].update(item.keys())
-
-                        if len(stats["sample_items"]) < 2:
-                            stats["sample_items"].append(item)
-                    elif isinstance(item, str):
-                        stats["content_type"] = "strings"
+                    item_type = type(item)
+                    if item_type is dict:
+                        array_stat.content_type = "objects"
+                        array_stat.object_keys.update(item.keys())
+
+                        if not array_stat.samples_full:
+                            array_stat.sample_items.append(item)
+                            array_stat.samples_full = len(array_stat.sample_items) >= 2
+                    elif item_type is str:
+                        array_stat.content_type = "strings"
                     else:
-                        stats["content_type"] = "primitives"
-
-    return array_stats
-
-
-def analyze_nested_objects(documents):
-    """
-    Analiza objetos anidados: recipients, viewers, createdBy, updatedBy, etc.
-    """
-    object_stats = {}
-
-    # Objetos conocidos de interés
-    known_objects = [
-        "createdBy",
-        "updatedBy",
-        "recipients",
-        "viewers",
-        "documentSteps",
-        "lumbreStatus",
-        "documentTypePrefix",
-        "instancePrivileges",
-        "calculatedProps",
-        "signerPositionMap",
-        "lumbreNextSigner",
-        "lumbreNextParticipant",
-        "lumbreNextReviewer",
-    ]
-
-    for doc in documents:
-        for key in known_objects:
-            value = doc.get(key)
-            if isinstance(value, dict):
-                if key not in object_stats:
-                    object_stats[key] = {"count": 0, "keys": Counter(), "sample": None}
-
-                object_stats[key]["count"] += 1
-                object_stats[key]["keys"].update(value.keys())
-
-                if object_stats[key]["sample"] is None:
-                    object_stats[key]["sample"] = value
-
-    return object_stats
+                        array_stat.content_type = "primitives"
+
+            # Objetos anidados, catálogos, snapshots y recipients/viewers
+            handlers = field_handlers(field_name)
+            if handlers is not None:
+                for handler in handlers:
+                    handler(field_name, value)
+
+            # Detectar si es campo dinámico (excluyendo campos conocidos de Mongo)
+            if (
+                dynamic_base_name(field_name) is not None
+                and field_name not in MONGO_FIELDS
+            ):
+                dynamic_fields[field_name]["count"] += 1
+                if len(dynamic_fields[field_name]["samples"]) < 2 and value:
+                    dynamic_fields[field_name]["samples"].append(value)
+                continue
 
+            field_stat = field_stats.get(field_name)
+            if field_stat is None:
+                field_stat = field_stats[field_name] = FieldStat()
 
-def analyze_embedded_catalogs(documents):
-    """
-    Analiza catálogos embebidos: lumbreStatus, documentTypePrefix, etc.
-    """
-    catalogs = {
-        "lumbreStatus": {},
-        "documentTypePrefix": {},
-        "documentTypeName": Counter(),
-        "documentTypeSignature": Counter(),
-        "documentTypeVisibility": Counter(),
-        "documentTypeComunicable": Counter(),
-    }
+            field_stat.count += 1
 
-    for doc in documents:
-        # lumbreStatus (objeto con id y name)
-        status = doc.get("lumbreStatus")
-        if isinstance(status, dict) and "id" in status:
-            status_id = status.get("id")
-            if status_id not in catalogs["lumbreStatus"]:
-                catalogs["lumbreStatus"][status_id] = {
-                    "name": status.get("name"),
-                    "count": 0,
-                }
-            catalogs["lumbreStatus"][status_id]["count"] += 1
-
-        # documentTypePrefix (objeto con id y name)
-        prefix = doc.get("documentTypePrefix")
-        if isinstance(prefix, dict) and "id" in prefix:
-            prefix_id = prefix.get("id")
-            if prefix_id not in catalogs["documentTypePrefix"]:
-                catalogs["documentTypePrefix"][prefix_id] = {
-                    "name": prefix.get("name"),
+            # Detectar tipo (una búsqueda en TYPE_NAMES; tipos raros -> string)
+            if value is None:
+                field_stat.null_count += 1
+            field_stat.types.add(type_name(value_type, "string"))
+
+            # Guardar samples (valores no vacíos, sin repetir)
+            if value and not field_stat.samples_full:
+                sample_str = short_repr(value)
+                if sample_str not in field_stat.sample_seen:
+                    field_stat.sample_seen.add(sample_str)
+                    field_stat.sample_values.append(sample_str)
+                    field_stat.samples_full = len(field_stat.sample_values) >= 3
+
+    def feed_object(self, key, value):
+        """Objetos anidados conocidos: presencia, keys y primer sample."""
+        if isinstance(value, dict):
+            object_stats = self.object_stats
+            if key not in object_stats:
+                object_stats[key] = {"count": 0, "keys": Counter(), "sample": None}
+
+            object_stats[key]["count"] += 1
+            object_stats[key]["keys"].update(value.keys())
+
+            if object_stats[key]["sample"] is None:
+                object_stats[key]["sample"] = value
+
+    def feed_object_catalog(self, key, value):
+        """Catálogos embebidos como objeto con id y name (lumbreStatus, etc.)."""
+        if isinstance(value, dict) and "id" in value:
+            catalog = self.catalogs[key]
+            item_id = value.get("id")
+            if item_id not in catalog:
+                catalog[item_id] = {
+                    "name": value.get("name"),
                     "count": 0,
                 }
-            catalogs["documentTypePrefix"][prefix_id]["count"] += 1
-
-        # Campos string que actúan como catálogos
-        for field in [
-            "documentTypeName",
-            "documentTypeSignature",
-            "documentTypeVisibility",
-            "documentTypeComunicable",
-        ]:
-            value = doc.get(field)
-            if value:
-                catalogs[field][value] += 1
-
-    return catalogs
-
-
-def analyze_user_snapshots(documents):
-    """
-    Analiza snapshots de usuarios en createdBy/updatedBy.
-    """
-    snapshot_stats = {
-        "createdBy": {
-            "present": 0,
-            "has_user": 0,
-            "user_keys": Counter(),
-            "unique_user_ids": set(),
-        },
-        "updatedBy": {
-            "present": 0,
-            "has_user": 0,
-            "user_keys": Counter(),
-            "unique_user_ids": set(),
-        },
-    }
-
-    for doc in documents:
-        for field in ["createdBy", "updatedBy"]:
-            value = doc.get(field)
-            if value:
-                snapshot_stats[field]["present"] += 1
-                user = value.get("user")
-                if user:
-                    snapshot_stats[field]["has_user"] += 1
-                    snapshot_stats[field]["user_keys"].update(user.keys())
-                    user_id = user.get("id") or user.get("_id")
-                    if user_id:
-                        snapshot_stats[field]["unique_user_ids"].add(str(user_id))
-
-    return snapshot_stats
-
-
-def analyze_recipients_viewers(documents):
-    """
-    Analiza estructura de recipients y viewers.
-    """
-    stats = {
-        "recipients": {
-            "users": {"docs_with_data": 0, "total_items": 0},
-            "areas": {"docs_with_data": 0, "total_items": 0},
-            "subareas": {"docs_with_data": 0, "total_items": 0},
-            "groups": {"docs_with_data": 0, "total_items": 0},
-            "emails": {"docs_with_data": 0, "total_items": 0},
-        },
-        "viewers": {
-            "users": {"docs_with_data": 0, "total_items": 0},
-            "areas": {"docs_with_data": 0, "total_items": 0},
-            "subareas": {"docs_with_data": 0, "total_items": 0},
-        },
-    }
-
+            catalog[item_id]["count"] += 1
+
+    def feed_string_catalog(self, key, value):
+        """Campos string que actúan como catálogos."""
+        if value:
+            catalog = self.catalogs[key]
+            catalog[value] = catalog.get(value, 0) + 1
+
+    def feed_snapshot(self, key, value):
+        """Snapshots de usuarios (createdBy/updatedBy)."""
+        if value:
+            stats = self.snapshot_stats[key]
+            stats["present"] += 1
+            user = value.get("user")
+            if user:
+                stats["has_user"] += 1
+                stats["user_keys"].update(user.keys())
+                user_id = user.get("id") or user.get("_id")
+                if user_id:
+                    stats["unique_user_ids"].add(str(user_id))
+
+    def feed_recipients(self, key, value):
+        """Recipients y viewers: docs con datos e items por subcampo."""
+        if isinstance(value, dict):
+            for subkey, data in self.rv_stats[key].items():
+                subvalue = value.get(subkey, [])
+                if isinstance(subvalue, list) and len(subvalue) > 0:
+                    data["docs_with_data"] += 1
+                    data["total_items"] += len(subvalue)
+
+    def finalize(self):
+        """Cierra los cálculos que dependen del total de documentos."""
+        for field_stat in self.field_stats.values():
+            field_stat.coverage = (field_stat.count / self.total_docs) * 100
+            field_stat.types = list(field_stat.types)
+
+        self.dynamic_fields = dict(self.dynamic_fields)
+
+
+def analyze_documents(documents):
+    """Recorre los documentos una sola vez y devuelve el analyzer con los resultados."""
+    analyzer = DocumentAnalyzer()
     for doc in documents:
-        for container in ["recipients", "viewers"]:
-            value = doc.get(container)
-            if isinstance(value, dict):
-                for subkey in stats[container].keys():
-                    subvalue = value.get(subkey, [])
-                    if isinstance(subvalue, list) and len(subvalue) > 0:
-                        stats[container][subkey]["docs_with_data"] += 1
-                        stats[container][subkey]["total_items"] += len(subvalue)
-
-    return stats
+        analyzer.feed(doc)
+    analyzer.finalize()
+    return analyzer
 
 
-def generate_report(documents):
+def generate_report(documents, output):
     """
-    Genera reporte completo de análisis.
+    Genera reporte completo de análisis escribiéndolo directamente en output
+    (archivo). Devuelve el analyzer para reutilizar las estadísticas ya calculadas.
     """
-    output = []
+    output_write = output.write
 
     def write(line=""):
-        output.append(line)
+        output_write(line)
+        output_write("\n")
 
     total_docs = len(documents)
 
+    # Todos los análisis salen de una sola pasada sobre los documentos
+    analyzer = analyze_documents(documents)
+
     # === HEADER ===
     write("=" * 80)
     write("ANÁLISIS ESTRUCTURAL: lml_documents_mesa4core")
@@ -352,26 +416,27 @@ def generate_report(documents):
     write()
 
     # === 1. CAMPOS DE PRIMER NIVEL ===
-    field_stats, dynamic_fields = analyze_field_coverage(documents)
+    field_stats = analyzer.field_stats
+    dynamic_fields = analyzer.dynamic_fields
 
     write("=" * 80)
     write("1. CAMPOS ESTÁTICOS (ordenados por cobertura)")
     write("=" * 80)
 
     sorted_fields = sorted(
-        field_stats.items(), key=lambda x: x[1]["coverage"], reverse=True
+        field_stats.items(), key=lambda x: x[1].coverage, reverse=True
     )
 
     for field_name, stats in sorted_fields:
-        coverage = stats["coverage"]
-        types_str = ", ".join(stats["types"])
+        coverage = stats.coverage
+        types_str = ", ".join(stats.types)
         write(f"\n{field_name}:")
-        write(f"  Cobertura: {coverage:.1f}% ({stats['count']}/{total_docs} docs)")
+        write(f"  Cobertura: {coverage:.1f}% ({stats.count}/{total_docs} docs)")
         write(f"  Tipos: {types_str}")
-        if stats["null_count"] > 0:
-            write(f"  Nulls: {stats['null_count']}")
-        if stats["sample_values"]:
-            samples = [str(s)[:80] for s in stats["sample_values"][:2]]
+        if stats.null_count > 0:
+            write(f"  Nulls: {stats.null_count}")
+        if stats.sample_values:
+            samples = [str(s)[:80] for s in stats.sample_values[:2]]
             write(f"  Samples: {samples}")
 
     # === 2. CAMPOS DINÁMICOS ===
@@ -387,12 +452,11 @@ def generate_report(documents):
     write()
 
     # Agrupar por patrón base
-    dynamic_pattern = re.compile(r"^(.+)_(\d+)$")
     base_patterns = Counter()
     for field_name in dynamic_fields.keys():
-        match = dynamic_pattern.match(field_name)
-        if match:
-            base_patterns[match.group(1)] += 1
+        base_name = dynamic_base_name(field_name)
+        if base_name is not None:
+            base_patterns[base_name] += 1
 
     write("Patrones base más comunes:")
     for pattern, count in base_patterns.most_common(20):
@@ -405,7 +469,7 @@ def generate_report(documents):
         write(f"  {field_name}: {stats['count']} docs")
 
     # === 3. ARRAYS ===
-    array_stats = analyze_arrays(documents)
+    array_stats = analyzer.array_stats
 
     write()
     write("=" * 80)
@@ -413,32 +477,32 @@ def generate_report(documents):
     write("=" * 80)
 
     for field_name, stats in sorted(array_stats.items()):
-        if not stats["sizes"]:
+        if not stats.sizes:
             continue
 
-        avg_size = sum(stats["sizes"]) / len(stats["sizes"]) if stats["sizes"] else 0
-        max_size = max(stats["sizes"]) if stats["sizes"] else 0
+        avg_size = sum(stats.sizes) / len(stats.sizes) if stats.sizes else 0
+        max_size = max(stats.sizes) if stats.sizes else 0
 
         write(f"\n{field_name}:")
-        write(f"  Docs con array: {stats['docs_with_array']}/{total_docs}")
-        write(f"  Docs con datos: {stats['docs_with_data']}/{total_docs}")
+        write(f"  Docs con array: {stats.docs_with_array}/{total_docs}")
+        write(f"  Docs con datos: {stats.docs_with_data}/{total_docs}")
         write(f"  Cardinalidad: min=0, max={max_size}, avg={avg_size:.1f}")
-        write(f"  Contenido: {stats['content_type']}")
+        write(f"  Contenido: {stats.content_type}")
 
-        if stats["object_keys"]:
-            top_keys = stats["object_keys"].most_common(10)
+        if stats.object_keys:
+            top_keys = stats.object_keys.most_common(10)
             write(f"  Keys en objetos: {', '.join([k for k, _ in top_keys])}")
 
-        if stats["sample_items"]:
+        if stats.sample_items:
             write(f"  Sample item:")
-            sample_str = json.dumps(stats["sample_items"][0], indent=4, default=str)
+            sample_str = dump_document(stats.sample_items[0])
             if len(sample_str) > 400:
                 sample_str = sample_str[:400] + "..."
             for line in sample_str.split("\n"):
                 write(f"    {line}")
 
     # === 4. OBJETOS ANIDADOS ===
-    object_stats = analyze_nested_objects(documents)
+    object_stats = analyzer.object_stats
 
     write()
     write("=" * 80)
@@ -451,7 +515,7 @@ def generate_report(documents):
         top_keys = stats["keys"].most_common(15)
         write(f"  Keys: {', '.join([k for k, _ in top_keys])}")
         if stats["sample"]:
-            sample_str = json.dumps(stats["sample"], indent=4, default=str)
+            sample_str = dump_document(stats["sample"])
             if len(sample_str) > 500:
                 sample_str = sample_str[:500] + "..."
             write(f"  Sample:")
@@ -459,7 +523,7 @@ def generate_report(documents):
                 write(f"    {line}")
 
     # === 5. CATÁLOGOS EMBEBIDOS ===
-    catalogs = analyze_embedded_catalogs(documents)
+    catalogs = analyzer.catalogs
 
     write()
     write("=" * 80)
@@ -484,26 +548,26 @@ def generate_report(documents):
 
     write("\n5.3. DOCUMENT TYPE NAME (Tipos de documento)")
     write("-" * 40)
-    for name, count in catalogs["documentTypeName"].most_common():
+    for name, count in Counter(catalogs["documentTypeName"]).most_common():
         write(f"  {name}: {count} docs")
 
     write("\n5.4. DOCUMENT TYPE SIGNATURE")
     write("-" * 40)
-    for name, count in catalogs["documentTypeSignature"].most_common():
+    for name, count in Counter(catalogs["documentTypeSignature"]).most_common():
         write(f"  {name}: {count} docs")
 
     write("\n5.5. DOCUMENT TYPE VISIBILITY")
     write("-" * 40)
-    for name, count in catalogs["documentTypeVisibility"].most_common():
+    for name, count in Counter(catalogs["documentTypeVisibility"]).most_common():
         write(f"  {name}: {count} docs")
 
     write("\n5.6. DOCUMENT TYPE COMUNICABLE")
     write("-" * 40)
-    for name, count in catalogs["documentTypeComunicable"].most_common():
+    for name, count in Counter(catalogs["documentTypeComunicable"]).most_common():
         write(f"  {name}: {count} docs")
 
     # === 6. REFERENCIAS A USUARIOS ===
-    snapshot_stats = analyze_user_snapshots(documents)
+    snapshot_stats = analyzer.snapshot_stats
 
     write()
     write("=" * 80)
@@ -520,7 +584,7 @@ def generate_report(documents):
             write(f"  Keys en user: {', '.join([k for k, _ in top_keys])}")
 
     # === 7. RECIPIENTS Y VIEWERS ===
-    rv_stats = analyze_recipients_viewers(documents)
+    rv_stats = analyzer.rv_stats
 
     write()
     write("=" * 80)
@@ -549,12 +613,9 @@ def generate_report(documents):
     for idx in sample_indices:
         doc = documents[idx]
         write(f"\n--- Documento {idx + 1} ---")
-        doc_str = json.dumps(doc, indent=2, default=str, ensure_ascii=False)
-        if len(doc_str) > 3000:
-            doc_str = doc_str[:3000] + "\n... [TRUNCADO]"
-        write(doc_str)
+        write(dump_json_truncated(doc, 3000))
 
-    return "\n".join(output)
+    return analyzer
 
 
 def main():
@@ -569,14 +630,12 @@ def main():
     print(f"✅ Cargados {len(documents)} documentos")
     print("📊 Analizando estructura...")
 
-    report = generate_report(documents)
-
-    # Guardar reporte
+    # Generar y guardar reporte (se escribe a archivo a medida que se genera)
     output_path = Path(OUTPUT_FILE)
     output_path.parent.mkdir(exist_ok=True)
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(report)
+    with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        analyzer = generate_report(documents, f)
 
     print(f"✅ Reporte guardado en: {OUTPUT_FILE}")
     print()
@@ -584,9 +643,10 @@ def main():
     print("RESUMEN RÁPIDO")
     print("=" * 60)
 
-    # Mostrar resumen en consola
-    field_stats, dynamic_fields = analyze_field_coverage(documents)
-    array_stats = analyze_arrays(documents)
+    # Mostrar resumen en consola (con las estadísticas del reporte)
+    field_stats = analyzer.field_stats
+    dynamic_fields = analyzer.dynamic_fields
+    array_stats = analyzer.array_stats
 
     print(f"\n📋 Campos estáticos: {len(field_stats)}")
     print(f"📋 Campos dinámicos: {len(dynamic_fields)}")
@@ -594,13 +654,15 @@ def main():
 
     # Arrays con datos
     arrays_with_data = [
-        name for name, stats in array_stats.items() if stats["docs_with_data"] > 0
+        name for name, stats in array_stats.items() if stats.docs_with_data > 0
     ]
     print(f"📋 Arrays con datos: {len(arrays_with_data)}")
     for name in arrays_with_data[:10]:
         stats = array_stats[name]
-        print(f"    - {name}: {stats['docs_with_data']} docs")
+        print(f"    - {name}: {stats.docs_with_data} docs")
 
 
 if __name__ == "__main__":
+    # Forzar UTF-8 para emojis en Windows (solo al ejecutar, no al importar)
+    force_utf8_stdout()
     main()
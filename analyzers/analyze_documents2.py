@@ -22,432 +22,445 @@ import json
 from pathlib import Path
 from datetime import datetime
 
+from json_helpers import load_json, orjson
+from utf8_stdout import force_utf8_stdout
+
 # Rutas relativas al script
 SCRIPT_DIR = Path(__file__).resolve().parent
 SAMPLE_FILE = SCRIPT_DIR.parent / "samples" / "lml_documents_mesa4core_sample.json"
 OUTPUT_FILE = SCRIPT_DIR.parent / "samples" / "lml_documents_jsonb_analysis.txt"
 
 
-def load_sample():
-    """Carga el archivo JSON de muestra."""
-    with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
+def dump_json(value):
+    """Serializa un ejemplo con indentación de 6 espacios (para el reporte)."""
+    if orjson is not None:
+        try:
+            text = orjson.dumps(
+                value, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            ).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass  # p.ej. enteros de más de 64 bits: se usa json de la stdlib
+        else:
+            # orjson solo indenta de a 2 espacios: se triplica la sangría de
+            # cada línea (los saltos dentro de strings van escapados)
+            lines = text.split("\n")
+            for i, line in enumerate(lines):
+                content = line.lstrip(" ")
+                lines[i] = " " * (3 * (len(line) - len(content))) + content
+            return "\n".join(lines)
+    return json.dumps(value, indent=6, ensure_ascii=False)
 
-def has_data(value):
-    """Verifica si un valor tiene datos reales."""
-    if value is None:
-        return False
-    if isinstance(value, dict):
-        # Para dicts, verificar si algún valor interno tiene datos
-        for v in value.values():
-            if has_data(v):
-                return True
-        return False
-    if isinstance(value, list):
-        return len(value) > 0
-    if isinstance(value, str):
-        return value.strip() != ""
-    return True
 
+def load_sample():
+    """Carga el archivo JSON de muestra."""
+    return load_json(SAMPLE_FILE)
 
-def find_docs_with_data(documents, field_name):
-    """Encuentra documentos donde un campo tiene datos."""
-    docs_with_data = []
 
-    for doc in documents:
-        value = doc.get(field_name)
-        if has_data(value):
-            docs_with_data.append(
-                {
-                    "_id": doc.get("_id"),
-                    "documentName": doc.get("documentName"),
-                    field_name: value,
-                }
-            )
+# Ejemplos que se muestran por campo en el reporte
+MAX_EXAMPLES = 3
 
-    return docs_with_data
+# Subarrays de recipients y viewers (en el orden del reporte)
+RECIPIENT_KEYS = ("users", "areas", "subareas", "groups", "emails")
+VIEWER_KEYS = ("users", "areas", "subareas")
 
+# Campos que se reportan solo si tienen datos reales (ver has_data)
+DATA_FIELDS = (
+    "lumbreNextSigner",
+    "lumbreNextParticipant",
+    "lumbreNextReviewer",
+    "lumbreSignerReviewer",
+    "lumbreSubstitute",
+)
 
-def find_recipients_with_data(documents):
-    """Encuentra documentos con recipients que tengan datos en algún subarray."""
-    results = {"users": [], "areas": [], "subareas": [], "groups": [], "emails": []}
 
-    for doc in documents:
-        recipients = doc.get("recipients", {})
-        if not isinstance(recipients, dict):
+def has_data(value):
+    """Verifica si un valor tiene datos reales."""
+    # Pila explícita en vez de recursión: los dicts anidados se apilan y se
+    # corta en el primer valor con datos
+    stack = [value]
+    while stack:
+        current = stack.pop()
+        if current is None:
             continue
+        # type() exacto: el JSON parseado solo trae dict/list/str/números/bool
+        current_type = type(current)
+        if current_type is dict:
+            # Para dicts, verificar si algún valor interno tiene datos
+            stack.extend(current.values())
+        elif current_type is list:
+            if len(current) > 0:
+                return True
+        elif current_type is str:
+            # Mismo criterio que strip() != "" sin crear el string recortado
+            if current != "" and not current.isspace():
+                return True
+        else:
+            return True
+    return False
 
-        for key in results.keys():
-            arr = recipients.get(key, [])
-            if arr and len(arr) > 0:
-                results[key].append(
-                    {
-                        "_id": doc.get("_id"),
-                        "documentName": doc.get("documentName"),
-                        key: arr,
-                    }
-                )
 
-    return results
+class DataBucket:
+    """
+    Documentos con datos en un campo: se cuentan todos pero solo se guardan
+    los primeros MAX_EXAMPLES como ejemplos (lo único que muestra el reporte).
+    """
 
+    __slots__ = ("field_name", "count", "samples")
 
-def find_viewers_with_data(documents):
-    """Encuentra documentos con viewers que tengan datos."""
-    results = {"users": [], "areas": [], "subareas": []}
+    def __init__(self, field_name):
+        self.field_name = field_name
+        self.count = 0
+        self.samples = []
 
-    for doc in documents:
-        viewers = doc.get("viewers", {})
-        if not isinstance(viewers, dict):
-            continue
-
-        for key in results.keys():
-            arr = viewers.get(key, [])
-            if arr and len(arr) > 0:
-                results[key].append(
-                    {
-                        "_id": doc.get("_id"),
-                        "documentName": doc.get("documentName"),
-                        key: arr,
-                    }
-                )
+    def add(self, doc_id, doc_name, value):
+        self.count += 1
+        if len(self.samples) < MAX_EXAMPLES:
+            self.samples.append(
+                {"_id": doc_id, "documentName": doc_name, self.field_name: value}
+            )
 
-    return results
 
+def scan_all(documents):
+    """
+    Recorre los documentos una sola vez y junta todos los resultados del
+    reporte: recipients, viewers, calculatedProps, documentSteps,
+    instancePrivileges y los campos lumbre* con datos.
 
-def analyze_calculated_props(documents):
-    """Analiza la estructura de calculated_props."""
-    samples = []
+    documents puede ser cualquier iterable (no se indexa ni se usa len()).
+    """
+    total_docs = 0
+    recipients_data = {key: DataBucket(key) for key in RECIPIENT_KEYS}
+    viewers_data = {key: DataBucket(key) for key in VIEWER_KEYS}
     everyone_can_access_values = {"True": 0, "False": 0}
-    who_can_access_with_data = []
+    who_can_access_with_data = DataBucket("calculatedProps")
+    position_values = {}
+    steps_with_items = DataBucket("documentSteps")
+    priv_with_data = DataBucket("instancePrivileges")
+    data_fields = {field: DataBucket(field) for field in DATA_FIELDS}
 
-    for doc in documents:
-        calc = doc.get("calculatedProps", {})
-        if not isinstance(calc, dict):
-            continue
+    # Pares (key, bucket) armados una vez, no un items() por documento
+    recipient_buckets = tuple(recipients_data.items())
+    viewer_buckets = tuple(viewers_data.items())
+    data_field_buckets = tuple(data_fields.items())
 
-        # Contar everyoneCanAccess
-        eca = calc.get("everyoneCanAccess")
-        if eca is True:
-            everyone_can_access_values["True"] += 1
-        elif eca is False:
-            everyone_can_access_values["False"] += 1
-
-        # Buscar whoCanAccess con datos
-        wca = calc.get("whoCanAccess", {})
-        if isinstance(wca, dict):
-            has_any = False
-            for key, arr in wca.items():
-                if isinstance(arr, list) and len(arr) > 0:
-                    has_any = True
-                    break
-
-            if has_any:
-                who_can_access_with_data.append(
-                    {
-                        "_id": doc.get("_id"),
-                        "documentName": doc.get("documentName"),
-                        "calculatedProps": calc,
-                    }
-                )
+    for doc in documents:
+        total_docs += 1
+        doc_id = doc.get("_id")
+        doc_name = doc.get("documentName")
+
+        # Sin defaults {} / []: un campo ausente devuelve None y lo descarta el
+        # isinstance, sin crear un contenedor vacío por documento
+
+        # Recipients con datos en algún subarray
+        recipients = doc.get("recipients")
+        if isinstance(recipients, dict):
+            for key, bucket in recipient_buckets:
+                arr = recipients.get(key)
+                if arr:
+                    bucket.add(doc_id, doc_name, arr)
+
+        # Viewers con datos
+        viewers = doc.get("viewers")
+        if isinstance(viewers, dict):
+            for key, bucket in viewer_buckets:
+                arr = viewers.get(key)
+                if arr:
+                    bucket.add(doc_id, doc_name, arr)
+
+        # calculatedProps
+        calc = doc.get("calculatedProps")
+        if isinstance(calc, dict):
+            # Contar everyoneCanAccess
+            eca = calc.get("everyoneCanAccess")
+            if eca is True:
+                everyone_can_access_values["True"] += 1
+            elif eca is False:
+                everyone_can_access_values["False"] += 1
+
+            # Buscar whoCanAccess con datos
+            wca = calc.get("whoCanAccess")
+            if isinstance(wca, dict):
+                # any() corta en el primer array con datos
+                if any(isinstance(arr, list) and arr for arr in wca.values()):
+                    who_can_access_with_data.add(doc_id, doc_name, calc)
+
+        # documentSteps: positions e items con datos
+        steps = doc.get("documentSteps")
+        if isinstance(steps, dict):
+            pos = steps.get("position")
+            if pos is not None:
+                pos_str = str(pos)
+                position_values[pos_str] = position_values.get(pos_str, 0) + 1
+
+            items = steps.get("items")
+            if items:
+                steps_with_items.add(doc_id, doc_name, steps)
+
+        # instancePrivileges con algún array con datos
+        priv = doc.get("instancePrivileges")
+        if isinstance(priv, dict) and any(
+            isinstance(arr, list) and arr for arr in priv.values()
+        ):
+            priv_with_data.add(doc_id, doc_name, priv)
+
+        # Campos lumbre* con datos
+        for field_name, bucket in data_field_buckets:
+            value = doc.get(field_name)
+            if has_data(value):
+                bucket.add(doc_id, doc_name, value)
 
     return {
-        "everyoneCanAccess_distribution": everyone_can_access_values,
-        "whoCanAccess_with_data": who_can_access_with_data,
+        "total_docs": total_docs,
+        "recipients": recipients_data,
+        "viewers": viewers_data,
+        "calculatedProps": {
+            "everyoneCanAccess_distribution": everyone_can_access_values,
+            "whoCanAccess_with_data": who_can_access_with_data,
+        },
+        "documentSteps": {
+            "position_distribution": position_values,
+            "with_items": steps_with_items,
+        },
+        "instancePrivileges": priv_with_data,
+        "data_fields": data_fields,
     }
 
 
-def analyze_document_steps(documents):
-    """Analiza document_steps buscando items con datos."""
-    with_items = []
-    position_values = {}
-
-    for doc in documents:
-        steps = doc.get("documentSteps", {})
-        if not isinstance(steps, dict):
-            continue
-
-        # Contar positions
-        pos = steps.get("position")
-        if pos is not None:
-            pos_str = str(pos)
-            position_values[pos_str] = position_values.get(pos_str, 0) + 1
-
-        # Buscar items con datos
-        items = steps.get("items", [])
-        if items and len(items) > 0:
-            with_items.append(
-                {
-                    "_id": doc.get("_id"),
-                    "documentName": doc.get("documentName"),
-                    "documentSteps": steps,
-                }
-            )
-
-    return {"position_distribution": position_values, "with_items": with_items}
-
-
-def analyze_instance_privileges(documents):
-    """Analiza instance_privileges buscando arrays con datos."""
-    with_data = []
-
-    for doc in documents:
-        priv = doc.get("instancePrivileges", {})
-        if not isinstance(priv, dict):
-            continue
+def generate_report(documents, output):
+    """Genera reporte completo escribiéndolo directamente en output (archivo)."""
+    output_write = output.write
 
-        has_any = False
-        for key, arr in priv.items():
-            if isinstance(arr, list) and len(arr) > 0:
-                has_any = True
-                break
-
-        if has_any:
-            with_data.append(
-                {
-                    "_id": doc.get("_id"),
-                    "documentName": doc.get("documentName"),
-                    "instancePrivileges": priv,
-                }
-            )
+    def write(line=""):
+        output_write(line)
+        output_write("\n")
 
-    return with_data
+    # Todos los análisis salen de una sola pasada sobre los documentos
+    # (incluido el total, así documents puede ser cualquier iterable)
+    results = scan_all(documents)
 
-
-def generate_report(documents):
-    """Genera reporte completo."""
-
-    output = []
-    output.append("=" * 80)
-    output.append("ANÁLISIS DE CAMPOS JSONB: lml_documents_mesa4core")
-    output.append(f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    output.append(f"Total documentos: {len(documents)}")
-    output.append("=" * 80)
+    write("=" * 80)
+    write("ANÁLISIS DE CAMPOS JSONB: lml_documents_mesa4core")
+    write(f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    write(f"Total documentos: {results['total_docs']}")
+    write("=" * 80)
 
     # =========================================================================
     # 1. RECIPIENTS
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("1. RECIPIENTS (documentos con datos)")
-    output.append("=" * 80)
+    write("\n" + "=" * 80)
+    write("1. RECIPIENTS (documentos con datos)")
+    write("=" * 80)
 
-    recipients_data = find_recipients_with_data(documents)
+    recipients_data = results["recipients"]
 
     for key, docs in recipients_data.items():
-        output.append(f"\n--- recipients.{key}: {len(docs)} documentos con datos ---")
+        write(f"\n--- recipients.{key}: {docs.count} documentos con datos ---")
 
-        if docs:
+        if docs.count:
             # Mostrar hasta 3 ejemplos
-            for i, doc in enumerate(docs[:3]):
-                output.append(f"\n  Ejemplo {i+1}:")
-                output.append(f"    documentName: {doc['documentName']}")
-                output.append(
-                    f"    {key}: {json.dumps(doc[key], indent=6, ensure_ascii=False)}"
+            for i, doc in enumerate(docs.samples):
+                write(f"\n  Ejemplo {i+1}:")
+                write(f"    documentName: {doc['documentName']}")
+                write(
+                    f"    {key}: {dump_json(doc[key])}"
                 )
 
     # =========================================================================
     # 2. VIEWERS
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("2. VIEWERS (documentos con datos)")
-    output.append("=" * 80)
+    write("\n" + "=" * 80)
+    write("2. VIEWERS (documentos con datos)")
+    write("=" * 80)
 
-    viewers_data = find_viewers_with_data(documents)
+    viewers_data = results["viewers"]
 
     for key, docs in viewers_data.items():
-        output.append(f"\n--- viewers.{key}: {len(docs)} documentos con datos ---")
-
-        if docs:
-            for i, doc in enumerate(docs[:3]):
-                output.append(f"\n  Ejemplo {i+1}:")
-                output.append(f"    documentName: {doc['documentName']}")
-                output.append(
-                    f"    {key}: {json.dumps(doc[key], indent=6, ensure_ascii=False)}"
+        write(f"\n--- viewers.{key}: {docs.count} documentos con datos ---")
+
+        if docs.count:
+            for i, doc in enumerate(docs.samples):
+                write(f"\n  Ejemplo {i+1}:")
+                write(f"    documentName: {doc['documentName']}")
+                write(
+                    f"    {key}: {dump_json(doc[key])}"
                 )
 
     # =========================================================================
     # 3. CALCULATED PROPS
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("3. CALCULATED PROPS")
-    output.append("=" * 80)
+    write("\n" + "=" * 80)
+    write("3. CALCULATED PROPS")
+    write("=" * 80)
 
-    calc_analysis = analyze_calculated_props(documents)
+    calc_analysis = results["calculatedProps"]
 
-    output.append(f"\n--- everyoneCanAccess distribution ---")
-    output.append(
+    write(f"\n--- everyoneCanAccess distribution ---")
+    write(
         f"    True: {calc_analysis['everyoneCanAccess_distribution']['True']}"
     )
-    output.append(
+    write(
         f"    False: {calc_analysis['everyoneCanAccess_distribution']['False']}"
     )
 
-    output.append(
-        f"\n--- whoCanAccess con datos: {len(calc_analysis['whoCanAccess_with_data'])} documentos ---"
+    write(
+        f"\n--- whoCanAccess con datos: {calc_analysis['whoCanAccess_with_data'].count} documentos ---"
     )
 
-    for i, doc in enumerate(calc_analysis["whoCanAccess_with_data"][:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    calculatedProps: {json.dumps(doc['calculatedProps'], indent=6, ensure_ascii=False)}"
+    for i, doc in enumerate(calc_analysis["whoCanAccess_with_data"].samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    calculatedProps: {dump_json(doc['calculatedProps'])}"
         )
 
     # =========================================================================
     # 4. DOCUMENT STEPS
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("4. DOCUMENT STEPS")
-    output.append("=" * 80)
+    write("\n" + "=" * 80)
+    write("4. DOCUMENT STEPS")
+    write("=" * 80)
 
-    steps_analysis = analyze_document_steps(documents)
+    steps_analysis = results["documentSteps"]
 
-    output.append(f"\n--- position distribution ---")
+    write(f"\n--- position distribution ---")
     for pos, count in sorted(steps_analysis["position_distribution"].items()):
-        output.append(f"    position={pos}: {count} docs")
+        write(f"    position={pos}: {count} docs")
 
-    output.append(
-        f"\n--- documentos con items[]: {len(steps_analysis['with_items'])} ---"
+    write(
+        f"\n--- documentos con items[]: {steps_analysis['with_items'].count} ---"
     )
 
-    for i, doc in enumerate(steps_analysis["with_items"][:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    documentSteps: {json.dumps(doc['documentSteps'], indent=6, ensure_ascii=False)}"
+    for i, doc in enumerate(steps_analysis["with_items"].samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    documentSteps: {dump_json(doc['documentSteps'])}"
         )
 
     # =========================================================================
     # 5. INSTANCE PRIVILEGES
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("5. INSTANCE PRIVILEGES")
-    output.append("=" * 80)
+    write("\n" + "=" * 80)
+    write("5. INSTANCE PRIVILEGES")
+    write("=" * 80)
 
-    priv_with_data = analyze_instance_privileges(documents)
+    priv_with_data = results["instancePrivileges"]
 
-    output.append(f"\n--- documentos con datos: {len(priv_with_data)} ---")
+    write(f"\n--- documentos con datos: {priv_with_data.count} ---")
 
-    for i, doc in enumerate(priv_with_data[:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    instancePrivileges: {json.dumps(doc['instancePrivileges'], indent=6, ensure_ascii=False)}"
+    for i, doc in enumerate(priv_with_data.samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    instancePrivileges: {dump_json(doc['instancePrivileges'])}"
         )
 
     # =========================================================================
     # 6. LUMBRE NEXT SIGNER
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("6. LUMBRE NEXT SIGNER")
-    output.append("=" * 80)
-
-    next_signer_docs = find_docs_with_data(documents, "lumbreNextSigner")
-    output.append(f"\n--- documentos con datos: {len(next_signer_docs)} ---")
-
-    for i, doc in enumerate(next_signer_docs[:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    lumbreNextSigner: {json.dumps(doc['lumbreNextSigner'], indent=6, ensure_ascii=False)}"
+    write("\n" + "=" * 80)
+    write("6. LUMBRE NEXT SIGNER")
+    write("=" * 80)
+
+    next_signer_docs = results["data_fields"]["lumbreNextSigner"]
+    write(f"\n--- documentos con datos: {next_signer_docs.count} ---")
+
+    for i, doc in enumerate(next_signer_docs.samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    lumbreNextSigner: {dump_json(doc['lumbreNextSigner'])}"
         )
 
     # =========================================================================
     # 7. LUMBRE NEXT PARTICIPANT
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("7. LUMBRE NEXT PARTICIPANT")
-    output.append("=" * 80)
-
-    next_part_docs = find_docs_with_data(documents, "lumbreNextParticipant")
-    output.append(f"\n--- documentos con datos: {len(next_part_docs)} ---")
-
-    for i, doc in enumerate(next_part_docs[:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    lumbreNextParticipant: {json.dumps(doc['lumbreNextParticipant'], indent=6, ensure_ascii=False)}"
+    write("\n" + "=" * 80)
+    write("7. LUMBRE NEXT PARTICIPANT")
+    write("=" * 80)
+
+    next_part_docs = results["data_fields"]["lumbreNextParticipant"]
+    write(f"\n--- documentos con datos: {next_part_docs.count} ---")
+
+    for i, doc in enumerate(next_part_docs.samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    lumbreNextParticipant: {dump_json(doc['lumbreNextParticipant'])}"
         )
 
     # =========================================================================
     # 8. LUMBRE NEXT REVIEWER
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("8. LUMBRE NEXT REVIEWER")
-    output.append("=" * 80)
-
-    next_rev_docs = find_docs_with_data(documents, "lumbreNextReviewer")
-    output.append(f"\n--- documentos con datos: {len(next_rev_docs)} ---")
-
-    for i, doc in enumerate(next_rev_docs[:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    lumbreNextReviewer: {json.dumps(doc['lumbreNextReviewer'], indent=6, ensure_ascii=False)}"
+    write("\n" + "=" * 80)
+    write("8. LUMBRE NEXT REVIEWER")
+    write("=" * 80)
+
+    next_rev_docs = results["data_fields"]["lumbreNextReviewer"]
+    write(f"\n--- documentos con datos: {next_rev_docs.count} ---")
+
+    for i, doc in enumerate(next_rev_docs.samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    lumbreNextReviewer: {dump_json(doc['lumbreNextReviewer'])}"
         )
 
     # =========================================================================
     # 9. LUMBRE SIGNER REVIEWER
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("9. LUMBRE SIGNER REVIEWER")
-    output.append("=" * 80)
-
-    signer_rev_docs = find_docs_with_data(documents, "lumbreSignerReviewer")
-    output.append(f"\n--- documentos con datos: {len(signer_rev_docs)} ---")
-
-    for i, doc in enumerate(signer_rev_docs[:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    lumbreSignerReviewer: {json.dumps(doc['lumbreSignerReviewer'], indent=6, ensure_ascii=False)}"
+    write("\n" + "=" * 80)
+    write("9. LUMBRE SIGNER REVIEWER")
+    write("=" * 80)
+
+    signer_rev_docs = results["data_fields"]["lumbreSignerReviewer"]
+    write(f"\n--- documentos con datos: {signer_rev_docs.count} ---")
+
+    for i, doc in enumerate(signer_rev_docs.samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    lumbreSignerReviewer: {dump_json(doc['lumbreSignerReviewer'])}"
         )
 
     # =========================================================================
     # 10. LUMBRE SUBSTITUTE
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("10. LUMBRE SUBSTITUTE")
-    output.append("=" * 80)
-
-    substitute_docs = find_docs_with_data(documents, "lumbreSubstitute")
-    output.append(f"\n--- documentos con datos: {len(substitute_docs)} ---")
-
-    for i, doc in enumerate(substitute_docs[:3]):
-        output.append(f"\n  Ejemplo {i+1}:")
-        output.append(f"    documentName: {doc['documentName']}")
-        output.append(
-            f"    lumbreSubstitute: {json.dumps(doc['lumbreSubstitute'], indent=6, ensure_ascii=False)}"
+    write("\n" + "=" * 80)
+    write("10. LUMBRE SUBSTITUTE")
+    write("=" * 80)
+
+    substitute_docs = results["data_fields"]["lumbreSubstitute"]
+    write(f"\n--- documentos con datos: {substitute_docs.count} ---")
+
+    for i, doc in enumerate(substitute_docs.samples):
+        write(f"\n  Ejemplo {i+1}:")
+        write(f"    documentName: {doc['documentName']}")
+        write(
+            f"    lumbreSubstitute: {dump_json(doc['lumbreSubstitute'])}"
         )
 
     # =========================================================================
     # RESUMEN
     # =========================================================================
-    output.append("\n" + "=" * 80)
-    output.append("RESUMEN")
-    output.append("=" * 80)
-
-    output.append("\nCampos con datos encontrados:")
-    output.append(f"  recipients.users: {len(recipients_data['users'])} docs")
-    output.append(f"  recipients.areas: {len(recipients_data['areas'])} docs")
-    output.append(f"  recipients.subareas: {len(recipients_data['subareas'])} docs")
-    output.append(f"  recipients.groups: {len(recipients_data['groups'])} docs")
-    output.append(f"  recipients.emails: {len(recipients_data['emails'])} docs")
-    output.append(f"  viewers.users: {len(viewers_data['users'])} docs")
-    output.append(f"  viewers.areas: {len(viewers_data['areas'])} docs")
-    output.append(f"  viewers.subareas: {len(viewers_data['subareas'])} docs")
-    output.append(
-        f"  calculatedProps.whoCanAccess: {len(calc_analysis['whoCanAccess_with_data'])} docs"
-    )
-    output.append(f"  documentSteps.items: {len(steps_analysis['with_items'])} docs")
-    output.append(f"  instancePrivileges: {len(priv_with_data)} docs")
-    output.append(f"  lumbreNextSigner: {len(next_signer_docs)} docs")
-    output.append(f"  lumbreNextParticipant: {len(next_part_docs)} docs")
-    output.append(f"  lumbreNextReviewer: {len(next_rev_docs)} docs")
-    output.append(f"  lumbreSignerReviewer: {len(signer_rev_docs)} docs")
-    output.append(f"  lumbreSubstitute: {len(substitute_docs)} docs")
-
-    return "\n".join(output)
+    write("\n" + "=" * 80)
+    write("RESUMEN")
+    write("=" * 80)
+
+    write("\nCampos con datos encontrados:")
+    # (campo, bucket) en el orden del resumen; las líneas se arman con un
+    # único formato y se escriben en un solo write
+    summary = [(f"recipients.{key}", recipients_data[key]) for key in RECIPIENT_KEYS]
+    summary += [(f"viewers.{key}", viewers_data[key]) for key in VIEWER_KEYS]
+    summary += [
+        ("calculatedProps.whoCanAccess", calc_analysis["whoCanAccess_with_data"]),
+        ("documentSteps.items", steps_analysis["with_items"]),
+        ("instancePrivileges", priv_with_data),
+    ]
+    summary += [(field, results["data_fields"][field]) for field in DATA_FIELDS]
+
+    summary_line = "  {}: {} docs".format
+    write("\n".join(summary_line(label, bucket.count) for label, bucket in summary))
 
 
 def main():
@@ -456,11 +469,10 @@ def main():
     print(f"Documentos cargados: {len(documents)}")
 
     print("Analizando campos JSONB...")
-    report = generate_report(documents)
-
     print(f"Guardando reporte en {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write(report)
+    # El reporte se escribe a medida que se genera (sin armarlo entero en memoria)
+    with open(OUTPUT_FILE, "w", encoding="utf-8", buffering=1 << 16) as f:
+        generate_report(documents, f)
 
     print("=" * 60)
     print("✅ Análisis completado")
@@ -469,4 +481,5 @@ def main():
 
 
 if __name__ == "__main__":
+    force_utf8_stdout()
     main()
@@ -3,16 +3,13 @@ Script de análisis profundo para lml_formbuilder_mesa4core.
 Analiza estructura JSON y genera reporte técnico para diseño de schema.
 """
 
-import json
-import sys
-from collections import Counter
+import io
+from collections import Counter, defaultdict
 from pathlib import Path
 from datetime import datetime
 
-import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
-
+from json_helpers import dump_document, load_json, walk_text
+from utf8_stdout import force_utf8_stdout
 
 def analyze_formbuilder():
     """Analiza la estructura completa de lml_formbuilder y genera reporte."""
@@ -21,14 +18,15 @@ def analyze_formbuilder():
     output_file = Path("samples/lml_formbuilder_analysis.txt")
     
     # Cargar JSON
-    with open(filepath, 'r', encoding='utf-8') as f:
-        docs = json.load(f)
+    docs = load_json(filepath)
     
-    # Preparar output
-    output = []
+    # Preparar output (buffer en memoria, se escribe a disco al final)
+    output = io.StringIO()
+    output_write = output.write
     
     def write(line=""):
-        output.append(line)
+        output_write(line)
+        output_write("\n")
         print(line)
     
     # === HEADER ===
@@ -37,19 +35,70 @@ def analyze_formbuilder():
     write(f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     write("=" * 70)
     write()
-    write(f"📊 Total documentos: {len(docs)}")
+    total_docs = len(docs)
+    write(f"📊 Total documentos: {total_docs}")
     write()
     
-    # === 1. CAMPOS DE PRIMER NIVEL ===
+    # === RECORRIDO ÚNICO ===
+    # Una sola pasada sobre docs alimenta todas las secciones del reporte
     all_keys = Counter()
+    array_sizes = defaultdict(list)      # campo -> tamaños (incluye arrays vacíos)
+    array_fields_detected = set()        # arrays con al menos un elemento
+    array_with_objects = set()           # arrays cuyo primer elemento es objeto
+    object_structures = defaultdict(set) # campo -> conjuntos de keys distintos
+    user_refs = 0
+    customer_refs = 0
+    
     for doc in docs:
         all_keys.update(doc.keys())
+        
+        for key, value in doc.items():
+            if isinstance(value, list):
+                array_sizes[key].append(len(value))
+                # Si el campo ya se marcó como array de objetos, no hay nada
+                # más que averiguar de su contenido
+                if value and key not in array_with_objects:
+                    array_fields_detected.add(key)
+                    if isinstance(value[0], dict):
+                        array_with_objects.add(key)
+            elif isinstance(value, dict):
+                object_structures[key].add(tuple(sorted(value.keys())))
+        
+        # Se buscan las keys y los valores string directamente, sin serializar
+        # cada documento a JSON (mismo resultado que buscar en json.dumps(doc))
+        has_user = False
+        has_customer = False
+        for text in walk_text(doc):
+            text = text.lower()
+            if not has_user and ('user' in text or 'createdby' in text):
+                has_user = True
+            if not has_customer and 'customer' in text:
+                has_customer = True
+            if has_user and has_customer:
+                break
+        if has_user:
+            user_refs += 1
+        if has_customer:
+            customer_refs += 1
+    
+    # Listas ordenadas que se reutilizan en varias secciones
+    sorted_keys = sorted(all_keys)
+    sorted_array_fields = sorted(array_fields_detected)
+    
+    # Línea "campo  count/total (pct%)": el formato se arma una sola vez y
+    # cada sección se escribe con un único write
+    coverage_line = "  {:35s} {:3d}/{:3d} ({:3d}%)".format
+    
+    def coverage_lines(keys):
+        return "\n".join(
+            coverage_line(key, all_keys[key], total_docs, all_keys[key] * 100 // total_docs)
+            for key in keys
+        )
     
+    # === 1. CAMPOS DE PRIMER NIVEL ===
     write("CAMPOS DE PRIMER NIVEL:")
     write("-" * 70)
-    for key, count in sorted(all_keys.items()):
-        pct = count * 100 // len(docs)
-        write(f"  {key:35s} {count:3d}/{len(docs):3d} ({pct:3d}%)")
+    write(coverage_lines(sorted_keys))
     write()
     
     # === 2. ANÁLISIS DE ARRAYS ===
@@ -57,33 +106,11 @@ def analyze_formbuilder():
     write("ARRAYS (cardinalidad y estructura):")
     write("-" * 70)
     
-    # Detectar todos los campos que son arrays
-    array_fields_detected = set()
-    for doc in docs:
-        for key, value in doc.items():
-            if isinstance(value, list) and len(value) > 0:
-                array_fields_detected.add(key)
-    
-    for field in sorted(array_fields_detected):
-        sizes = []
-        has_objects = False
-        has_simple = False
-        
-        for doc in docs:
-            if field in doc and isinstance(doc[field], list):
-                sizes.append(len(doc[field]))
-                
-                # Detectar tipo de contenido
-                if len(doc[field]) > 0:
-                    if isinstance(doc[field][0], dict):
-                        has_objects = True
-                    else:
-                        has_simple = True
-        
-        if sizes:
-            avg = sum(sizes) / len(sizes)
-            content_type = "objects" if has_objects else "simple"
-            write(f"  {field:35s} Avg: {avg:5.1f}  Min: {min(sizes):3d}  Max: {max(sizes):3d}  [{content_type}]")
+    for field in sorted_array_fields:
+        sizes = array_sizes[field]
+        avg = sum(sizes) / len(sizes)
+        content_type = "objects" if field in array_with_objects else "simple"
+        write(f"  {field:35s} Avg: {avg:5.1f}  Min: {min(sizes):3d}  Max: {max(sizes):3d}  [{content_type}]")
     write()
     
     # === 3. ENTIDADES COMPARTIDAS ===
@@ -91,18 +118,8 @@ def analyze_formbuilder():
     write("BÚSQUEDA DE ENTIDADES COMPARTIDAS:")
     write("-" * 70)
     
-    user_refs = 0
-    customer_refs = 0
-    
-    for doc in docs:
-        doc_str = json.dumps(doc)
-        if 'user' in doc_str.lower() or 'createdby' in doc_str.lower():
-            user_refs += 1
-        if 'customer' in doc_str.lower():
-            customer_refs += 1
-    
-    write(f"  Docs con referencia a 'user': {user_refs}/{len(docs)}")
-    write(f"  Docs con referencia a 'customer': {customer_refs}/{len(docs)}")
+    write(f"  Docs con referencia a 'user': {user_refs}/{total_docs}")
+    write(f"  Docs con referencia a 'customer': {customer_refs}/{total_docs}")
     write()
     
     # === 4. CAMPOS JSONB CANDIDATOS ===
@@ -110,14 +127,10 @@ def analyze_formbuilder():
     write("CANDIDATOS A JSONB (estructura variable):")
     write("-" * 70)
     
+    # Objetos con estructura variable
     jsonb_candidates = []
-    for key in sorted(all_keys.keys()):
-        # Buscar objetos con estructura variable
-        structures = set()
-        for doc in docs:
-            if key in doc and isinstance(doc[key], dict):
-                structures.add(tuple(sorted(doc[key].keys())))
-        
+    for key in sorted(object_structures.keys()):
+        structures = object_structures[key]
         if len(structures) > 1:
             jsonb_candidates.append((key, len(structures)))
     
@@ -133,11 +146,9 @@ def analyze_formbuilder():
     write("CAMPOS DE TIMESTAMP:")
     write("-" * 70)
     
-    timestamp_fields = [k for k in all_keys.keys() if 'at' in k.lower() or 'date' in k.lower()]
-    for field in sorted(timestamp_fields):
-        count = all_keys[field]
-        pct = count * 100 // len(docs)
-        write(f"  {field:35s} {count:3d}/{len(docs):3d} ({pct:3d}%)")
+    timestamp_fields = [k for k in sorted_keys if 'at' in k.lower() or 'date' in k.lower()]
+    if timestamp_fields:
+        write(coverage_lines(timestamp_fields))
     write()
     
     # === 6. DOCUMENTOS COMPLETOS ===
@@ -146,10 +157,10 @@ def analyze_formbuilder():
     write("=" * 70)
     write()
     
-    indices = [0, len(docs) // 2, len(docs) - 1]
+    indices = [0, total_docs // 2, total_docs - 1]
     for i, idx in enumerate(indices, 1):
         write(f"[Documento {i} - Índice {idx}]")
-        write(json.dumps(docs[idx], indent=2, default=str))
+        write(dump_document(docs[idx]))
         write()
     
     # === 7. RECOMENDACIONES ===
@@ -160,15 +171,15 @@ def analyze_formbuilder():
     
     write("TABLA PRINCIPAL (lml_formbuilder.main):")
     write("  ✅ formbuilder_id VARCHAR(255) PRIMARY KEY")
-    for key in sorted(all_keys.keys()):
+    for key in sorted_keys:
         if key not in ['_id'] and not isinstance(docs[0].get(key), (list, dict)):
             write(f"  • {key}")
     write()
     
     write("TABLAS RELACIONADAS (candidatos - si avg > 5):")
-    for field in sorted(array_fields_detected):
-        sizes = [len(doc.get(field, [])) for doc in docs if isinstance(doc.get(field), list)]
-        if sizes and sum(sizes) / len(sizes) > 5:
+    for field in sorted_array_fields:
+        sizes = array_sizes[field]
+        if sum(sizes) / len(sizes) > 5:
             write(f"  → lml_formbuilder.{field}")
     write()
     
@@ -178,11 +189,12 @@ def analyze_formbuilder():
     write()
     
     # Guardar a archivo
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(output))
+    output_file.write_text(output.getvalue(), encoding='utf-8')
     
     print(f"\n✅ Análisis guardado en: {output_file}")
 
 
 if __name__ == "__main__":
+    # Forzar UTF-8 para emojis en Windows (solo al ejecutar, no al importar)
+    force_utf8_stdout()
     analyze_formbuilder()
@@ -3,20 +3,17 @@ Script de análisis profundo para el json de lml_listbuilder
 y generar un txt complementario para analisis
 """
 
-import json
-import sys
 from collections import Counter, defaultdict
 from pathlib import Path
 
-import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+from json_helpers import dump_document, load_json, walk_text
+from utf8_stdout import force_utf8_stdout
+
 
 def analyze_listbuilder():
     filepath = Path("samples/lml_listbuilder_mesa4core_sample.json")
     
-    with open(filepath, 'r', encoding='utf-8') as f:
-        docs = json.load(f)
+    docs = load_json(filepath)
     
     print(f"{'='*70}")
     print(f"ANÁLISIS ESTRUCTURAL: lml_listbuilder_mesa4core")
@@ -25,15 +22,16 @@ def analyze_listbuilder():
     print(f"📊 Total documentos: {len(docs)}\n")
     
     # 1. Campos de primer nivel
-    all_keys = Counter()
-    for doc in docs:
-        all_keys.update(doc.keys())
+    # Un solo Counter sobre todas las keys (el conteo corre en C, sin un
+    # update() por documento)
+    all_keys = Counter(key for doc in docs for key in doc)
+    total_docs = len(docs)
     
     print("CAMPOS DE PRIMER NIVEL:")
     print("-" * 70)
     for key, count in sorted(all_keys.items()):
-        pct = count * 100 // len(docs)
-        print(f"  {key:35s} {count:3d}/{len(docs):3d} ({pct:3d}%)")
+        pct = count * 100 // total_docs
+        print(f"  {key:35s} {count:3d}/{total_docs:3d} ({pct:3d}%)")
     
     # 2. Analizar arrays (candidatos a tablas relacionadas)
     print(f"\n{'='*70}")
@@ -47,14 +45,28 @@ def analyze_listbuilder():
     ]
     
     for field in array_fields:
-        sizes = []
+        # Si el campo no aparece en ningún documento no hace falta recorrerlos
+        if field not in all_keys:
+            print(f"  {field:35s} (no presente)")
+            continue
+        
+        # Cantidad, suma, mínimo y máximo en una sola pasada (sin lista de tamaños)
+        count = total = 0
+        min_size = max_size = None
         for doc in docs:
-            if field in doc and isinstance(doc[field], list):
-                sizes.append(len(doc[field]))
+            value = doc.get(field)
+            if isinstance(value, list):
+                size = len(value)
+                count += 1
+                total += size
+                if min_size is None or size < min_size:
+                    min_size = size
+                if max_size is None or size > max_size:
+                    max_size = size
         
-        if sizes:
-            avg = sum(sizes) / len(sizes)
-            print(f"  {field:35s} Avg: {avg:5.1f}  Min: {min(sizes):3d}  Max: {max(sizes):3d}")
+        if count:
+            avg = total / count
+            print(f"  {field:35s} Avg: {avg:5.1f}  Min: {min_size:3d}  Max: {max_size:3d}")
         else:
             print(f"  {field:35s} (no presente)")
     
@@ -67,11 +79,25 @@ def analyze_listbuilder():
     customer_refs = []
     
     for doc in docs:
-        doc_str = json.dumps(doc)
-        if 'user' in doc_str.lower() or 'createdby' in doc_str.lower():
-            user_refs.append(doc.get('_id', {}).get('$oid', 'unknown'))
-        if 'customer' in doc_str.lower():
-            customer_refs.append(doc.get('_id', {}).get('$oid', 'unknown'))
+        # Se buscan las keys y los valores string directamente, sin serializar
+        # cada documento a JSON (mismo resultado que buscar en json.dumps(doc))
+        has_user = False
+        has_customer = False
+        for text in walk_text(doc):
+            text = text.lower()
+            if not has_user and ('user' in text or 'createdby' in text):
+                has_user = True
+            if not has_customer and 'customer' in text:
+                has_customer = True
+            if has_user and has_customer:
+                break
+        if has_user or has_customer:
+            # El id se resuelve una sola vez por documento
+            doc_id = doc.get('_id', {}).get('$oid', 'unknown')
+            if has_user:
+                user_refs.append(doc_id)
+            if has_customer:
+                customer_refs.append(doc_id)
     
     print(f"  Docs con referencia a 'user': {len(user_refs)}/{len(docs)}")
     print(f"  Docs con referencia a 'customer': {len(customer_refs)}/{len(docs)}")
@@ -84,7 +110,7 @@ def analyze_listbuilder():
     indices = [0, len(docs) // 2, len(docs) - 1]
     for i, idx in enumerate(indices, 1):
         print(f"\n[Documento {i} - Índice {idx}]")
-        print(json.dumps(docs[idx], indent=2, default=str))
+        print(dump_document(docs[idx]))
         print()
     
     # 5. Análisis de valores únicos en campos clave
@@ -104,4 +130,5 @@ def analyze_listbuilder():
                 print(f"    - {val}")
 
 if __name__ == "__main__":
+    force_utf8_stdout()
     analyze_listbuilder()
\ No newline at end of file
@@ -16,24 +16,25 @@ Genera reporte completo en samples/lml_people_analysis.txt
 import json
 import sys
 import io
+import re
 from collections import defaultdict
 from pathlib import Path
 
-# Forzar UTF-8 para emojis en Windows
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+from json_helpers import TYPE_NAMES, dump_document, load_json
+from utf8_stdout import force_utf8_stdout
 
 # Configuración
 SAMPLE_FILE = "samples/lml_people_mesa4core_sample.json"
 OUTPUT_FILE = "samples/lml_people_analysis.txt"
 
+# Campos dinámicos de formulario: _0, _1, _2, ...
+DYNAMIC_FIELD = re.compile(r"_\d+")
+
 
 def load_sample():
     """Carga el archivo JSON de sample."""
     try:
-        with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
+        return load_json(SAMPLE_FILE)
     except FileNotFoundError:
         print(f"[ERROR] No se encontró el archivo {SAMPLE_FILE}")
         return None
@@ -47,66 +48,52 @@ def analyze_field_coverage(documents):
     Analiza qué campos existen y en cuántos documentos aparecen.
     Retorna dict con stats por campo.
     """
-    field_stats = {}
+    field_stats = defaultdict(
+        lambda: {
+            "count": 0,
+            "types": set(),
+            "sample_values": [],
+            "sample_seen": set(),  # Strings ya guardados en sample_values (dedup O(1))
+            "null_count": 0,
+        }
+    )
     total_docs = len(documents)
+    type_name = TYPE_NAMES.get  # Lookup local: se llama por cada valor
 
     for doc in documents:
-        for field_name in doc.keys():
-            if field_name not in field_stats:
-                field_stats[field_name] = {
-                    "count": 0,
-                    "types": set(),
-                    "sample_values": [],
-                    "null_count": 0,
-                }
-
-            field_stats[field_name]["count"] += 1
-            value = doc.get(field_name)
+        for field_name, value in doc.items():
+            stats = field_stats[field_name]
+            stats["count"] += 1
 
             # Contar nulls
-            if value is None or value == "":
-                field_stats[field_name]["null_count"] += 1
+            is_empty = value is None or value == ""
+            if is_empty:
+                stats["null_count"] += 1
 
             # Detectar tipo
-            if value is None:
-                field_type = "null"
-            elif isinstance(value, dict):
-                field_type = "object"
-            elif isinstance(value, list):
-                field_type = "array"
-            elif isinstance(value, bool):
-                field_type = "boolean"
-            elif isinstance(value, int):
-                field_type = "integer"
-            elif isinstance(value, float):
-                field_type = "float"
-            else:
-                field_type = "string"
-
-            field_stats[field_name]["types"].add(field_type)
+            stats["types"].add(type_name(type(value), "string"))
 
             # Guardar samples (primeros 3 valores únicos no-null)
-            if len(field_stats[field_name]["sample_values"]) < 3 and value not in [
-                None,
-                "",
-            ]:
-                if value not in field_stats[field_name]["sample_values"]:
-                    # Para objetos y arrays, convertir a string
-                    if isinstance(value, (dict, list)):
-                        field_stats[field_name]["sample_values"].append(
-                            json.dumps(value, default=str)[:100]
-                        )
-                    else:
-                        field_stats[field_name]["sample_values"].append(
-                            str(value)[:100]
-                        )
+            sample_values = stats["sample_values"]
+            if not is_empty and len(sample_values) < 3:
+                # Para objetos y arrays, convertir a string
+                if isinstance(value, (dict, list)):
+                    sample = json.dumps(value, default=str)[:100]
+                else:
+                    sample = str(value)[:100]
+
+                sample_seen = stats["sample_seen"]
+                if sample not in sample_seen:
+                    sample_seen.add(sample)
+                    sample_values.append(sample)
 
     # Calcular cobertura porcentual
     for field_name, stats in field_stats.items():
         stats["coverage"] = (stats["count"] / total_docs) * 100
         stats["types"] = list(stats["types"])
+        del stats["sample_seen"]
 
-    return field_stats
+    return dict(field_stats)
 
 
 def analyze_dynamic_fields(documents):
@@ -114,49 +101,47 @@ def analyze_dynamic_fields(documents):
     Analiza campos dinámicos que siguen patrón _N (ej: _0, _1, _2, _3).
     Retorna dict con stats de cada campo dinámico.
     """
-    dynamic_fields = {}  # Cambiar de defaultdict a dict normal
+    # La estructura se crea al primer acceso; se devuelve como dict normal
+    dynamic_fields = defaultdict(
+        lambda: {
+            "count": 0,
+            "types": set(),
+            "nested_structure": defaultdict(int),
+        }
+    )
+
+    is_dynamic = DYNAMIC_FIELD.fullmatch
 
     for doc in documents:
         for field_name, value in doc.items():
-            # Detectar campos dinámicos (empiezan con _)
-            if field_name.startswith("_") and field_name[1:].isdigit():
-                # Inicializar estructura si es la primera vez que vemos este campo
-                if field_name not in dynamic_fields:
-                    dynamic_fields[field_name] = {
-                        "count": 0,
-                        "types": set(),
-                        "nested_structure": {},
-                    }
-
-                dynamic_fields[field_name]["count"] += 1
+            # Detectar campos dinámicos (_ seguido solo de dígitos)
+            if is_dynamic(field_name):
+                stats = dynamic_fields[field_name]
+                stats["count"] += 1
 
                 # Detectar tipo
+                value_type = type(value)
                 if value is None or value == "":
                     field_type = "null/empty"
-                elif isinstance(value, dict):
+                elif value_type is dict:
                     field_type = "object"
                     # Analizar estructura anidada
+                    nested_structure = stats["nested_structure"]
                     for nested_key in value.keys():
-                        if (
-                            nested_key
-                            not in dynamic_fields[field_name]["nested_structure"]
-                        ):
-                            dynamic_fields[field_name]["nested_structure"][
-                                nested_key
-                            ] = 0
-                        dynamic_fields[field_name]["nested_structure"][nested_key] += 1
-                elif isinstance(value, str):
+                        nested_structure[nested_key] += 1
+                elif value_type is str:
                     field_type = "string"
                 else:
-                    field_type = type(value).__name__
+                    field_type = value_type.__name__
 
-                dynamic_fields[field_name]["types"].add(field_type)
+                stats["types"].add(field_type)
 
     # Convertir sets a listas para serialización JSON
     for field_name, stats in dynamic_fields.items():
         stats["types"] = list(stats["types"])
+        stats["nested_structure"] = dict(stats["nested_structure"])
 
-    return dynamic_fields
+    return dict(dynamic_fields)
 
 
 def extract_embedded_catalogs(documents):
@@ -168,6 +153,8 @@ def extract_embedded_catalogs(documents):
         "people_types": {},  # {id: {name, alias, count}}
         "person_id_types": {},  # {id: {name, count}}
     }
+    people_types = catalogs["people_types"]
+    person_id_types = catalogs["person_id_types"]
 
     for doc in documents:
         # Analizar peopleType (vía peopleTypeId, peopleTypeName, peopleTypeAlias)
@@ -176,13 +163,15 @@ def extract_embedded_catalogs(documents):
         people_type_alias = doc.get("peopleTypeAlias")
 
         if people_type_id:
-            if people_type_id not in catalogs["people_types"]:
-                catalogs["people_types"][people_type_id] = {
+            # Una sola búsqueda por documento; name/alias quedan del primero visto
+            entry = people_types.get(people_type_id)
+            if entry is None:
+                entry = people_types[people_type_id] = {
                     "name": people_type_name,
                     "alias": people_type_alias,
                     "count": 0,
                 }
-            catalogs["people_types"][people_type_id]["count"] += 1
+            entry["count"] += 1
 
         # Analizar personIdType
         person_id_type = doc.get("personIdType")
@@ -191,12 +180,13 @@ def extract_embedded_catalogs(documents):
             id_type_name = person_id_type.get("name")
 
             if id_type_id:
-                if id_type_id not in catalogs["person_id_types"]:
-                    catalogs["person_id_types"][id_type_id] = {
+                entry = person_id_types.get(id_type_id)
+                if entry is None:
+                    entry = person_id_types[id_type_id] = {
                         "name": id_type_name,
                         "count": 0,
                     }
-                catalogs["person_id_types"][id_type_id]["count"] += 1
+                entry["count"] += 1
 
     return catalogs
 
@@ -261,19 +251,25 @@ def generate_report(documents):
     catalogs = extract_embedded_catalogs(documents)
     user_refs = analyze_user_references(documents)
 
-    # Preparar contenido del reporte
-    lines = []
-    lines.append("=" * 80)
-    lines.append("ANÁLISIS ESTRUCTURAL: lml_people_mesa4core")
-    lines.append("=" * 80)
-    lines.append(f"\n📊 Total documentos analizados: {total_docs}\n")
+    # Preparar contenido del reporte (buffer en memoria, sin lista + join)
+    report = io.StringIO()
+    report_write = report.write
+
+    def write(line=""):
+        report_write(line)
+        report_write("\n")
+
+    write("=" * 80)
+    write("ANÁLISIS ESTRUCTURAL: lml_people_mesa4core")
+    write("=" * 80)
+    write(f"\n📊 Total documentos analizados: {total_docs}\n")
 
     # 1. CAMPOS DE PRIMER NIVEL
-    lines.append("\n" + "=" * 80)
-    lines.append("1. CAMPOS DE PRIMER NIVEL")
-    lines.append("=" * 80)
-    lines.append(f"{'Campo':<30} {'Cobertura':<15} {'Tipos':<20} {'Nulls'}")
-    lines.append("-" * 80)
+    write("\n" + "=" * 80)
+    write("1. CAMPOS DE PRIMER NIVEL")
+    write("=" * 80)
+    write(f"{'Campo':<30} {'Cobertura':<15} {'Tipos':<20} {'Nulls'}")
+    write("-" * 80)
 
     # Ordenar por nombre de campo
     for field_name in sorted(field_stats.keys()):
@@ -281,93 +277,91 @@ def generate_report(documents):
         coverage = f"{stats['count']}/{total_docs} ({stats['coverage']:.0f}%)"
         types_str = ", ".join(stats["types"])
         null_info = f"{stats['null_count']}" if stats["null_count"] > 0 else "-"
-        lines.append(f"{field_name:<30} {coverage:<15} {types_str:<20} {null_info}")
+        write(f"{field_name:<30} {coverage:<15} {types_str:<20} {null_info}")
 
         # Mostrar samples si existen
         if stats["sample_values"]:
             for sample in stats["sample_values"][:2]:
-                lines.append(f"  └─ Ejemplo: {sample}")
+                write(f"  └─ Ejemplo: {sample}")
 
     # 2. CAMPOS DINÁMICOS
     if dynamic_stats:
-        lines.append("\n" + "=" * 80)
-        lines.append("2. CAMPOS DINÁMICOS (Patrón _N)")
-        lines.append("=" * 80)
-        lines.append(
+        write("\n" + "=" * 80)
+        write("2. CAMPOS DINÁMICOS (Patrón _N)")
+        write("=" * 80)
+        write(
             "Estos campos tienen nombres como _0, _1, _2, etc. y contienen datos de formulario.\n"
         )
 
         for field_name in sorted(dynamic_stats.keys()):
             stats = dynamic_stats[field_name]
-            lines.append(f"\n{field_name}:")
-            lines.append(f"  Apariciones: {stats['count']}/{total_docs}")
-            lines.append(f"  Tipos: {', '.join(stats['types'])}")
+            write(f"\n{field_name}:")
+            write(f"  Apariciones: {stats['count']}/{total_docs}")
+            write(f"  Tipos: {', '.join(stats['types'])}")
 
             if stats["nested_structure"]:
-                lines.append("  Estructura anidada detectada:")
+                write("  Estructura anidada detectada:")
                 for nested_key, count in sorted(stats["nested_structure"].items()):
-                    lines.append(f"    • {nested_key}: {count} docs")
+                    write(f"    • {nested_key}: {count} docs")
 
     # 3. CATÁLOGOS EMBEBIDOS
-    lines.append("\n" + "=" * 80)
-    lines.append("3. CATÁLOGOS EMBEBIDOS")
-    lines.append("=" * 80)
+    write("\n" + "=" * 80)
+    write("3. CATÁLOGOS EMBEBIDOS")
+    write("=" * 80)
 
-    lines.append("\n3.1. PEOPLE TYPES (Tipos de Persona)")
-    lines.append("-" * 80)
+    write("\n3.1. PEOPLE TYPES (Tipos de Persona)")
+    write("-" * 80)
     if catalogs["people_types"]:
         for pt_id, pt_data in catalogs["people_types"].items():
-            lines.append(f"  {pt_id}:")
-            lines.append(f"    Nombre: {pt_data['name']}")
-            lines.append(f"    Alias: {pt_data['alias']}")
-            lines.append(f"    Documentos: {pt_data['count']}")
+            write(f"  {pt_id}:")
+            write(f"    Nombre: {pt_data['name']}")
+            write(f"    Alias: {pt_data['alias']}")
+            write(f"    Documentos: {pt_data['count']}")
     else:
-        lines.append("  (No se encontraron people types)")
+        write("  (No se encontraron people types)")
 
-    lines.append("\n3.2. PERSON ID TYPES (Tipos de Documento)")
-    lines.append("-" * 80)
+    write("\n3.2. PERSON ID TYPES (Tipos de Documento)")
+    write("-" * 80)
     if catalogs["person_id_types"]:
         for idt_id, idt_data in catalogs["person_id_types"].items():
-            lines.append(f"  {idt_id}:")
-            lines.append(f"    Nombre: {idt_data['name']}")
-            lines.append(f"    Documentos: {idt_data['count']}")
+            write(f"  {idt_id}:")
+            write(f"    Nombre: {idt_data['name']}")
+            write(f"    Documentos: {idt_data['count']}")
     else:
-        lines.append("  (No se encontraron person ID types)")
+        write("  (No se encontraron person ID types)")
 
     # 4. REFERENCIAS A USUARIOS
-    lines.append("\n" + "=" * 80)
-    lines.append("4. REFERENCIAS A USUARIOS (Auditoría)")
-    lines.append("=" * 80)
-    lines.append("\n4.1. createdBy")
-    lines.append(f"  Presente: {user_refs['createdBy']['present']}/{total_docs}")
-    lines.append(f"  Faltante: {user_refs['createdBy']['missing']}/{total_docs}")
-    lines.append(f"  Usuarios únicos: {user_refs['createdBy']['unique_users']}")
-
-    lines.append("\n4.2. updatedBy")
-    lines.append(f"  Presente: {user_refs['updatedBy']['present']}/{total_docs}")
-    lines.append(f"  Faltante: {user_refs['updatedBy']['missing']}/{total_docs}")
-    lines.append(f"  Usuarios únicos: {user_refs['updatedBy']['unique_users']}")
+    write("\n" + "=" * 80)
+    write("4. REFERENCIAS A USUARIOS (Auditoría)")
+    write("=" * 80)
+    write("\n4.1. createdBy")
+    write(f"  Presente: {user_refs['createdBy']['present']}/{total_docs}")
+    write(f"  Faltante: {user_refs['createdBy']['missing']}/{total_docs}")
+    write(f"  Usuarios únicos: {user_refs['createdBy']['unique_users']}")
+
+    write("\n4.2. updatedBy")
+    write(f"  Presente: {user_refs['updatedBy']['present']}/{total_docs}")
+    write(f"  Faltante: {user_refs['updatedBy']['missing']}/{total_docs}")
+    write(f"  Usuarios únicos: {user_refs['updatedBy']['unique_users']}")
 
     # 5. DOCUMENTOS COMPLETOS (MUESTRAS)
-    lines.append("\n" + "=" * 80)
-    lines.append("5. DOCUMENTOS COMPLETOS (Muestras)")
-    lines.append("=" * 80)
-    lines.append("\nSe muestran 3 documentos: primero, medio y último del sample.\n")
+    write("\n" + "=" * 80)
+    write("5. DOCUMENTOS COMPLETOS (Muestras)")
+    write("=" * 80)
+    write("\nSe muestran 3 documentos: primero, medio y último del sample.\n")
 
     indices = [0, total_docs // 2, total_docs - 1]
     for i, idx in enumerate(indices, 1):
-        lines.append(f"\n{'─' * 80}")
-        lines.append(f"Documento {i} (índice {idx}):")
-        lines.append("─" * 80)
-        lines.append(
-            json.dumps(documents[idx], indent=2, default=str, ensure_ascii=False)
-        )
+        write(f"\n{'─' * 80}")
+        write(f"Documento {i} (índice {idx}):")
+        write("─" * 80)
+        write(dump_document(documents[idx]))
 
     # 6. RECOMENDACIONES DE NORMALIZACIÓN
-    lines.append("\n" + "=" * 80)
-    lines.append("6. RECOMENDACIONES DE NORMALIZACIÓN")
-    lines.append("=" * 80)
-    lines.append(
+    write("\n" + "=" * 80)
+    write("6. RECOMENDACIONES DE NORMALIZACIÓN")
+    write("=" * 80)
+    write(
         """
 BASADO EN EL ANÁLISIS, SE RECOMIENDA:
 
@@ -404,10 +398,8 @@ BASADO EN EL ANÁLISIS, SE RECOMIENDA:
     )
 
     # Escribir reporte a archivo
-    report_content = "\n".join(lines)
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write(report_content)
+    report_content = report.getvalue()
+    Path(OUTPUT_FILE).write_text(report_content, encoding="utf-8")
 
     print(f"✅ Reporte generado: {OUTPUT_FILE}")
     print(f"📄 Tamaño: {len(report_content) / 1024:.2f} KB")
@@ -434,4 +426,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Forzar UTF-8 para emojis en Windows (solo al ejecutar, no al importar)
+    force_utf8_stdout()
     main()
@@ -3,30 +3,50 @@
 Script de análisis estructural para lml_processtypes_mesa4core.
 Genera reporte completo para diseño de schema PostgreSQL.
 
+Input: samples/lml_processtypes_mesa4core_sample.json (array JSON generado
+       por export_sample.py; se carga completo, el sample es de 200 docs)
 Output: samples/lml_processtypes_analysis.txt
 """
 
 import json
-import sys
-from collections import Counter, defaultdict
+from collections import Counter
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
 
-import io
-
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+from json_helpers import TYPE_NAMES, dump_document, load_json
+from utf8_stdout import force_utf8_stdout
 
 # Configuración
 SAMPLE_FILE = Path("samples/lml_processtypes_mesa4core_sample.json")
 OUTPUT_FILE = Path("samples/lml_processtypes_analysis.txt")
+PREVIEW_LINES = 100  # Líneas del reporte que se muestran por consola
+
+# Orden en que se listan los tipos de cada campo en el reporte
+TYPE_ORDER = (str, dict, list, int, bool, float, type(None))
+
+# Campos candidatos a enum (pocos valores únicos)
+ENUM_FIELDS = frozenset(
+    {
+        "typeNumerator",
+        "typeComments",
+        "typeCanBeTaken",
+        "lumbreVersion",
+        "deleted",
+        "published",
+        "isEditable",
+        "tadAvailable",
+    }
+)
+
+# Un bit por tipo: los tipos de cada campo se acumulan como máscara (str = 1)
+TYPE_BITS = {value_type: 1 << i for i, value_type in enumerate(TYPE_ORDER)}
 
 
 def load_sample():
     """Carga el archivo JSON de sample."""
     try:
-        with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return load_json(SAMPLE_FILE)
     except FileNotFoundError:
         print(f"[ERROR] No se encontró: {SAMPLE_FILE}")
         return None
@@ -35,84 +55,88 @@ def load_sample():
         return None
 
 
-def analyze_field_coverage(documents):
+def analyze_documents(documents):
     """
-    Analiza campos de primer nivel: cobertura, tipos, samples.
+    Recorre los documentos una sola vez y alimenta todos los análisis:
+    cobertura de campos, arrays, objetos anidados, snapshots de usuario,
+    foreign keys y candidatos a enum.
     """
-    field_stats = {}
     total_docs = len(documents)
 
+    # Campos de primer nivel: cobertura, tipos, samples
+    field_stats = {}
+
+    # Arrays: cardinalidad, estructura interna, campos de objetos
+    array_stats = {}
+
+    # Objetos anidados: estructura, campos internos
+    object_stats = {}
+
+    # Snapshots de usuarios (createdBy/updatedBy)
+    snapshots = {
+        "createdBy": {"count": 0, "user_ids": set(), "structure": None},
+        "updatedBy": {"count": 0, "user_ids": set(), "structure": None},
+    }
+
+    # Posibles foreign keys a otras colecciones
+    fk_candidates = {
+        "customerId": {"count": 0, "unique_values": set()},
+        "listbuilderId": {"count": 0, "unique_values": set()},
+        "formbuilderId": {"count": 0, "unique_values": set()},
+        "_master": {"count": 0, "unique_values": set()},
+    }
+
+    # Campos que podrían ser enums (pocos valores únicos)
+    string_fields = {field: set() for field in ENUM_FIELDS}
+
+    type_bit = TYPE_BITS.get
+
     for doc in documents:
-        for field_name in doc.keys():
-            if field_name not in field_stats:
-                field_stats[field_name] = {
+        get = doc.get
+
+        for field_name, value in doc.items():
+            stats = field_stats.get(field_name)
+            if stats is None:
+                stats = field_stats[field_name] = {
                     "count": 0,
-                    "types": set(),
+                    "types": 0,
                     "sample_values": [],
+                    "sample_seen": set(),  # Reprs ya guardados en sample_values (dedup O(1))
                     "null_count": 0,
                 }
 
-            field_stats[field_name]["count"] += 1
-            value = doc.get(field_name)
+            stats["count"] += 1
 
-            # Detectar tipo
+            # Detectar tipo con una sola búsqueda en TYPE_BITS en vez de una
+            # cadena de comparaciones (JSON no genera subclases)
+            value_type = type(value)
             if value is None:
-                field_type = "null"
-                field_stats[field_name]["null_count"] += 1
-            elif isinstance(value, dict):
-                field_type = "object"
-            elif isinstance(value, list):
-                field_type = "array"
-            elif isinstance(value, bool):
-                field_type = "boolean"
-            elif isinstance(value, int):
-                field_type = "integer"
-            elif isinstance(value, float):
-                field_type = "float"
-            else:
-                field_type = "string"
-
-            field_stats[field_name]["types"].add(field_type)
-
-            # Guardar samples (hasta 3 valores únicos representativos)
-            if len(field_stats[field_name]["sample_values"]) < 3 and value is not None:
-                if isinstance(value, list):
+                stats["null_count"] += 1
+
+            stats["types"] |= type_bit(value_type, 1)
+
+            # Guardar samples (hasta 3 valores únicos representativos). Una vez
+            # juntados los 3 se saltea toda la construcción del repr
+            sample_values = stats["sample_values"]
+            if value is not None and len(sample_values) < 3:
+                if value_type is list:
                     sample_repr = f"array[{len(value)}]"
-                elif isinstance(value, dict):
-                    keys = list(value.keys())[:5]
+                elif value_type is dict:
+                    keys = list(islice(value, 5))
                     sample_repr = f"object{{{', '.join(keys)}}}"
                 else:
                     sample_repr = str(value)[:60]
 
-                if sample_repr not in field_stats[field_name]["sample_values"]:
-                    field_stats[field_name]["sample_values"].append(sample_repr)
-
-    # Calcular cobertura
-    for field_name, stats in field_stats.items():
-        stats["coverage"] = (stats["count"] / total_docs) * 100
-        stats["types"] = list(stats["types"])
-
-    return field_stats
-
+                sample_seen = stats["sample_seen"]
+                if sample_repr not in sample_seen:
+                    sample_seen.add(sample_repr)
+                    sample_values.append(sample_repr)
 
-def analyze_arrays(documents):
-    """
-    Analiza arrays: cardinalidad, estructura interna, campos de objetos.
-    """
-    array_stats = {}
-
-    # Arrays conocidos de processtypes (basado en sample)
-    known_arrays = [
-        "processFields",
-        "processTypeSteps",
-    ]
-
-    # Detectar todos los arrays dinámicamente
-    for doc in documents:
-        for key, value in doc.items():
-            if isinstance(value, list):
-                if key not in array_stats:
-                    array_stats[key] = {
+            # Arrays (la entrada se crea la primera vez que aparece el campo)
+            if value_type is list:
+                arr_stats = array_stats.get(field_name)
+                if arr_stats is None:
+                    arr_stats = array_stats[field_name] = {
                         "sizes": [],
                         "docs_with_array": 0,
                         "content_type": None,
@@ -120,128 +144,93 @@ def analyze_arrays(documents):
                         "sample_items": [],
                     }
 
-    # Analizar cada array
-    for doc in documents:
-        for field_name, stats in array_stats.items():
-            value = doc.get(field_name)
-
-            if isinstance(value, list):
-                stats["docs_with_array"] += 1
-                stats["sizes"].append(len(value))
+                arr_stats["docs_with_array"] += 1
+                arr_stats["sizes"].append(len(value))
 
                 # Analizar contenido
+                object_keys_update = arr_stats["object_keys"].update
+                sample_items = arr_stats["sample_items"]
                 for item in value:
-                    if isinstance(item, dict):
-                        stats["content_type"] = "objects"
-                        stats["object_keys"].update(item.keys())
+                    if type(item) is dict:
+                        arr_stats["content_type"] = "objects"
+                        object_keys_update(item.keys())
 
                         # Guardar sample
-                        if len(stats["sample_items"]) < 2:
-                            stats["sample_items"].append(item)
+                        if len(sample_items) < 2:
+                            sample_items.append(item)
                     else:
-                        stats["content_type"] = "primitives"
-
-    return array_stats
-
-
-def analyze_nested_objects(documents):
-    """
-    Analiza objetos anidados: estructura, campos internos.
-    """
-    object_stats = {}
-
-    for doc in documents:
-        for key, value in doc.items():
-            if isinstance(value, dict) and not key.startswith("_"):
-                if key not in object_stats:
-                    object_stats[key] = {"count": 0, "keys": Counter(), "sample": None}
-
-                object_stats[key]["count"] += 1
-                object_stats[key]["keys"].update(value.keys())
+                        arr_stats["content_type"] = "primitives"
+
+            # Objetos anidados
+            elif value_type is dict and not field_name.startswith("_"):
+                obj_stats = object_stats.get(field_name)
+                if obj_stats is None:
+                    obj_stats = object_stats[field_name] = {
+                        "count": 0,
+                        "keys": Counter(),
+                        "sample": None,
+                    }
 
-                if object_stats[key]["sample"] is None:
-                    object_stats[key]["sample"] = value
+                obj_stats["count"] += 1
+                obj_stats["keys"].update(value.keys())
 
-    return object_stats
+                # Se guarda una referencia, no una copia: el objeto ya vive en
+                # documents hasta que termina el reporte
+                if obj_stats["sample"] is None:
+                    obj_stats["sample"] = value
 
+            # Foreign keys (las keys de fk_candidates son los campos a mirar)
+            fk_stats = fk_candidates.get(field_name)
+            if fk_stats is not None and value:
+                fk_stats["count"] += 1
+                fk_stats["unique_values"].add(str(value))
 
-def analyze_user_snapshots(documents):
-    """
-    Analiza snapshots de usuarios (createdBy/updatedBy).
-    """
-    snapshots = {
-        "createdBy": {"count": 0, "user_ids": set(), "structure": None},
-        "updatedBy": {"count": 0, "user_ids": set(), "structure": None},
-    }
+            # Candidatos a enum (se detectan en el mismo recorrido de campos)
+            if field_name in ENUM_FIELDS and value is not None:
+                string_fields[field_name].add(str(value))
 
-    for doc in documents:
-        for field in ["createdBy", "updatedBy"]:
-            value = doc.get(field)
-            if isinstance(value, dict):
-                snapshots[field]["count"] += 1
+        # Snapshots de usuario
+        for field, snapshot in snapshots.items():
+            value = get(field)
+            if type(value) is dict:
+                snapshot["count"] += 1
 
                 # Extraer user_id
                 user = value.get("user", {})
-                if isinstance(user, dict):
+                if type(user) is dict:
                     user_id = user.get("id") or user.get("_id")
                     if user_id:
-                        if isinstance(user_id, dict):
+                        if type(user_id) is dict:
                             user_id = user_id.get("$oid")
-                        snapshots[field]["user_ids"].add(str(user_id))
+                        snapshot["user_ids"].add(str(user_id))
 
                 # Guardar estructura
-                if snapshots[field]["structure"] is None:
-                    snapshots[field]["structure"] = value
-
-    return snapshots
-
-
-def analyze_foreign_keys(documents):
-    """
-    Detecta posibles foreign keys a otras colecciones.
-    """
-    fk_candidates = {
-        "customerId": {"count": 0, "unique_values": set()},
-        "listbuilderId": {"count": 0, "unique_values": set()},
-        "formbuilderId": {"count": 0, "unique_values": set()},
-        "_master": {"count": 0, "unique_values": set()},
-    }
-
-    for doc in documents:
-        for field, stats in fk_candidates.items():
-            value = doc.get(field)
-            if value:
-                stats["count"] += 1
-                stats["unique_values"].add(str(value))
-
-    return fk_candidates
+                if snapshot["structure"] is None:
+                    snapshot["structure"] = value
 
-
-def analyze_enum_candidates(documents):
-    """
-    Detecta campos que podrían ser enums (pocos valores únicos).
-    """
-    string_fields = defaultdict(set)
-
-    # Campos candidatos a enum
-    candidates = [
-        "typeNumerator",
-        "typeComments",
-        "typeCanBeTaken",
-        "lumbreVersion",
-        "deleted",
-        "published",
-        "isEditable",
-        "tadAvailable",
-    ]
-
-    for doc in documents:
-        for field in candidates:
-            value = doc.get(field)
-            if value is not None:
-                string_fields[field].add(str(value))
-
-    return {k: list(v) for k, v in string_fields.items()}
+    # Calcular cobertura (una sola división: un campo presente en todos los
+    # docs da exactamente 100.0, que es lo que usa el chequeo NULL/NOT NULL)
+    for field_name, stats in field_stats.items():
+        stats["coverage"] = stats["count"] * 100 / total_docs
+        del stats["sample_seen"]
+        types_mask = stats["types"]
+        stats["types"] = [
+            TYPE_NAMES[value_type]
+            for value_type in TYPE_ORDER
+            if types_mask & TYPE_BITS[value_type]
+        ]
+
+    # Solo los candidatos que aparecieron con algún valor
+    enum_candidates = {k: list(v) for k, v in string_fields.items() if v}
+
+    return (
+        field_stats,
+        array_stats,
+        object_stats,
+        snapshots,
+        fk_candidates,
+        enum_candidates,
+    )
 
 
 def generate_report(
@@ -255,11 +244,20 @@ def generate_report(
     output,
 ):
     """
-    Genera el reporte completo.
+    Genera el reporte completo escribiéndolo directamente en output (archivo).
+    Devuelve las primeras PREVIEW_LINES líneas y el total de líneas escritas.
     """
+    preview = []
+    total_lines = 0
+    output_write = output.write
 
     def write(line=""):
-        output.append(line)
+        nonlocal total_lines
+        output_write(line)
+        output_write("\n")
+        if total_lines < PREVIEW_LINES:
+            preview.append(line)
+        total_lines += 1
 
     total_docs = len(documents)
 
@@ -310,13 +308,14 @@ def generate_report(
         write(f"  Contenido: {stats['content_type']}")
 
         if stats["object_keys"]:
+            # most_common(n) ya usa heapq.nlargest: no ordena todo el Counter
             top_keys = stats["object_keys"].most_common(10)
             write(f"  Keys en objetos: {', '.join([k for k, _ in top_keys])}")
 
         if stats["sample_items"]:
             write(f"  Sample item:")
             write(
-                f"    {json.dumps(stats['sample_items'][0], indent=4, default=str)[:500]}"
+                f"    {dump_document(stats['sample_items'][0])[:500]}"
             )
 
     # === 3. OBJETOS ANIDADOS ===
@@ -331,7 +330,7 @@ def generate_report(
         top_keys = stats["keys"].most_common(10)
         write(f"  Keys: {', '.join([k for k, _ in top_keys])}")
         if stats["sample"]:
-            sample_str = json.dumps(stats["sample"], indent=4, default=str)
+            sample_str = dump_document(stats["sample"])
             if len(sample_str) > 400:
                 sample_str = sample_str[:400] + "..."
             write(f"  Sample:")
@@ -350,7 +349,7 @@ def generate_report(
         write(f"  Usuarios únicos: {len(stats['user_ids'])}")
         if stats["structure"]:
             write(f"  Estructura:")
-            struct_str = json.dumps(stats["structure"], indent=4, default=str)
+            struct_str = dump_document(stats["structure"])
             if len(struct_str) > 600:
                 struct_str = struct_str[:600] + "..."
             for line in struct_str.split("\n"):
@@ -421,7 +420,7 @@ def generate_report(
     if fk_candidates["formbuilderId"]["count"] > 0:
         write("  - formbuilder_id → lml_formbuilder.main(formbuilder_id)")
 
-    return output
+    return preview, total_lines
 
 
 def main():
@@ -434,42 +433,41 @@ def main():
     print(f"[OK] {len(documents)} documentos cargados")
     print("[*] Analizando estructura...")
 
-    # Ejecutar análisis
-    field_stats = analyze_field_coverage(documents)
-    array_stats = analyze_arrays(documents)
-    object_stats = analyze_nested_objects(documents)
-    snapshots = analyze_user_snapshots(documents)
-    fk_candidates = analyze_foreign_keys(documents)
-    enum_candidates = analyze_enum_candidates(documents)
-
-    # Generar reporte
-    output = []
-    generate_report(
-        documents,
+    # Ejecutar análisis (una sola pasada sobre los documentos)
+    (
         field_stats,
         array_stats,
         object_stats,
         snapshots,
         fk_candidates,
         enum_candidates,
-        output,
-    )
-
-    # Escribir a archivo
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write("\n".join(output))
+    ) = analyze_documents(documents)
+
+    # Generar reporte (se escribe a archivo a medida que se genera)
+    with open(OUTPUT_FILE, "w", encoding="utf-8", buffering=1 << 20) as f:
+        preview, total_lines = generate_report(
+            documents,
+            field_stats,
+            array_stats,
+            object_stats,
+            snapshots,
+            fk_candidates,
+            enum_candidates,
+            f,
+        )
 
     print(f"\n[OK] Reporte generado: {OUTPUT_FILE}")
 
     # También imprimir a consola
     print("\n" + "=" * 80)
-    print("PREVIEW DEL REPORTE (primeras 100 líneas):")
+    print(f"PREVIEW DEL REPORTE (primeras {PREVIEW_LINES} líneas):")
     print("=" * 80)
-    for line in output[:100]:
+    for line in preview:
         print(line)
-    if len(output) > 100:
-        print(f"\n... ({len(output) - 100} líneas más en el archivo)")
+    if total_lines > PREVIEW_LINES:
+        print(f"\n... ({total_lines - PREVIEW_LINES} líneas más en el archivo)")
 
 
 if __name__ == "__main__":
+    force_utf8_stdout()
     main()
@@ -0,0 +1,64 @@
+"""
+Helpers compartidos por los analyzers para leer, recorrer y serializar JSON.
+"""
+
+import json
+
+try:
+    import orjson  # Opcional: parser en C, mucho más rápido que json
+except ImportError:
+    orjson = None
+
+# Nombre de tipo por type() exacto (bool no cae en int como con isinstance)
+TYPE_NAMES = {
+    type(None): "null",
+    dict: "object",
+    list: "array",
+    bool: "boolean",
+    int: "integer",
+    float: "float",
+    str: "string",
+}
+
+
+def load_json(path):
+    """
+    Lee el archivo completo y lo parsea (orjson si está instalado, si no json).
+    Los errores de parseo son json.JSONDecodeError: orjson.JSONDecodeError
+    hereda de ella.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def walk_text(obj):
+    """Recorre un documento y devuelve sus keys y valores string (a cualquier nivel)."""
+    # Pila explícita en vez de recursión: menos overhead por llamada y sin
+    # RecursionError con anidamientos profundos. El orden no importa acá.
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        current_type = type(current)
+        if current_type is dict:
+            for key, value in current.items():
+                yield key
+                stack.append(value)
+        elif current_type is list:
+            stack.extend(current)
+        elif current_type is str:
+            yield current
+
+
+def dump_document(doc):
+    """Serializa un documento completo con indentación de 2 espacios (para el reporte)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                doc, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str
+            ).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass  # p.ej. enteros de más de 64 bits: se usa json de la stdlib
+    return json.dumps(doc, indent=2, default=str, ensure_ascii=False)
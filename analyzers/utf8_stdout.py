@@ -0,0 +1,14 @@
+"""
+Helper compartido por los analyzers para la salida por consola.
+"""
+
+import sys
+
+
+def force_utf8_stdout():
+    """Fuerza UTF-8 en stdout/stderr (emojis en Windows) solo si no lo están ya."""
+    for stream in (sys.stdout, sys.stderr):
+        encoding = (getattr(stream, "encoding", None) or "").lower()
+        if encoding.replace("-", "").replace("_", "") != "utf8":
+            # reconfigure (3.7+) cambia el encoding sin envolver el stream otra vez
+            stream.reconfigure(encoding="utf-8")
@@ -13,6 +13,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tests'))
 from test_syntax import test_syntax
 from test_migrator_interface import run_all_tests as test_interface
 from test_schema_integrity import run_all_tests as test_schema
+from test_analyze_documents import run_all_tests as test_analyzers
 
 
 def main():
@@ -23,6 +24,7 @@ def main():
     1. Sintaxis (si falla aquí, no tiene sentido continuar)
     2. Interfaz (validar herencia y métodos)
     3. Schema (validar coherencia entre código y base de datos)
+    4. Analyzers (helpers puros de los scripts de análisis)
     """
     print("=" * 70)
     print("🚀 INICIANDO SUITE DE TESTS")
@@ -54,6 +56,12 @@ def main():
     print("=" * 70)
     results['schema'] = test_schema()
     
+    # Test 4: Analyzers
+    print("\n" + "=" * 70)
+    print("🔍 FASE 4: HELPERS DE ANALYZERS")
+    print("=" * 70)
+    results['analyzers'] = test_analyzers()
+    
     # Resumen final
     print_summary(results)
     
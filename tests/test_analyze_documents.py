@@ -0,0 +1,87 @@
+"""
+Test de equivalencia para helpers puros de los analyzers.
+
+Verifica que dynamic_base_name (analyze_documents.py) clasifica los campos
+dinámicos igual que el regex original (DYNAMIC_FIELD_REGEX).
+"""
+
+import os
+import re
+import sys
+
+# === RESOLUCIÓN DE PATH ===
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analyzers")
+)
+
+from analyze_documents import dynamic_base_name
+
+DYNAMIC_FIELD_REGEX = re.compile(r"^(.+)_(\d+)$")
+
+# Nombres de campo a comparar (dinámicos, casi dinámicos y bordes)
+CASES = [
+    "a_1",
+    "_1",
+    "a_",
+    "a_b_12",
+    "a__3",
+    "campo_nombre_3",
+    "campo_nombre",
+    "a_1b",
+    "a_\u0661\u0662",  # Dígitos arábigos: \d y isdecimal los aceptan
+    "_",
+    "",
+]
+
+
+def regex_base_name(field_name):
+    """Nombre base según el regex original (None si no es dinámico)."""
+    match = DYNAMIC_FIELD_REGEX.match(field_name)
+    return match.group(1) if match else None
+
+
+# === TESTS ===
+
+
+def test_dynamic_base_name_matches_regex():
+    """Verifica que dynamic_base_name devuelve lo mismo que el regex en cada caso."""
+    print("\n=== TEST: dynamic_base_name vs regex ===")
+
+    for field_name in CASES:
+        expected = regex_base_name(field_name)
+        result = dynamic_base_name(field_name)
+        assert result == expected, f"{field_name!r}: {result!r} != {expected!r} (regex)"
+        print(f"   ✅ {field_name!r} -> {result!r}")
+
+
+def run_all_tests():
+    """Ejecuta todos los tests de helpers de analyzers."""
+    print("=" * 70)
+    print("🧪 TESTS DE HELPERS DE ANALYZERS")
+    print("=" * 70)
+
+    tests = [test_dynamic_base_name_matches_regex]
+
+    failed = 0
+
+    for test_func in tests:
+        try:
+            test_func()
+        except AssertionError as e:
+            print(f"\n❌ FALLO: {test_func.__name__}")
+            print(f"   {e}")
+            failed += 1
+
+    print("\n" + "=" * 70)
+
+    if failed == 0:
+        print("✅ TODOS LOS TESTS PASARON")
+        return True
+    else:
+        print(f"❌ {failed} TESTS FALLARON")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    sys.exit(0 if success else 1)